@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import itertools
+
+from colorama import Fore, Style, init
+
+from analysis import parse_verdict
+from main import (
+    acreate_handler,
+    add_run_args,
+    afork_conversation,
+    configure_run,
+    parse_entity,
+    print_metrics_summary,
+    reject_humans,
+    save_game,
+)
+from models.metrics import get_recorder
+from models.registry import clients
+from results_store import get_store
+
+init(autoreset=True)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Play the first rounds of a game once, then continue them with several interrogated variants "
+                    "(models and evasion modes) in parallel.",
+        epilog="Example:\n"
+               "  python3 ablation.py --interrogator claude::KEY --interrogated openai::KEY --shared-rounds 2 "
+               "--branches openai::KEY gemini::KEY --branch-evasion both\n",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "--interrogator",
+        required=True,
+        help="The interrogator in the format: gemini/llama/claude/openai/mock::<API_KEY>.",
+    )
+    parser.add_argument(
+        "--interrogated",
+        required=True,
+        help="The interrogated of the shared rounds in the format: gemini/llama/claude/openai/mock::<API_KEY>.",
+    )
+    parser.add_argument(
+        "--evasion",
+        action="store_true",
+        help="Play the shared rounds in evasion mode.",
+    )
+    parser.add_argument(
+        "--shared-rounds",
+        type=int,
+        required=True,
+        help="Number of rounds played once and shared by all branches.",
+    )
+    parser.add_argument(
+        "--branches",
+        nargs="+",
+        help="Interrogated entities that continue the shared rounds (default: the interrogated of the shared rounds).",
+    )
+    parser.add_argument(
+        "--branch-evasion",
+        choices=["off", "on", "both"],
+        default="both",
+        help="Evasion modes of the branches: without evasion, with evasion, or both.",
+    )
+    parser.add_argument(
+        "--test",
+        action="store_true",
+        help="Use the cheap models for every LLM.",
+    )
+    add_run_args(parser, jury=False, batch=True)
+    return parser.parse_args()
+
+
+async def run_ablation(args):
+    interrogator_type, interrogator_key = parse_entity(args.interrogator)
+    adaptive = args.confidence_threshold is not None
+    evasion_modes = {"off": [False], "on": [True], "both": [False, True]}[args.branch_evasion]
+    variants = list(itertools.product(args.branches or [args.interrogated], evasion_modes))
+
+    async def handlers(entity, evasion):
+        entity_type, key = parse_entity(entity)
+        return (await acreate_handler(interrogator_type, "interrogator", args.test, evasion, interrogator_key,
+                                      args.questions, adaptive),
+                await acreate_handler(entity_type, "interrogated", args.test, evasion, key, args.questions, adaptive))
+
+    interrogator, interrogated = await handlers(args.interrogated, args.evasion)
+    branches = [await handlers(entity, evasion) for entity, evasion in variants]
+    try:
+        histories = await afork_conversation(interrogator, interrogated, branches, args.questions,
+                                             args.shared_rounds, confidence_threshold=args.confidence_threshold)
+    finally:
+        await clients.aclose()
+    return variants, histories
+
+
+def main():
+    args = parse_args()
+    configure_run(args)
+    reject_humans([args.interrogated] + (args.branches or []),
+                  "Humans can't be interrogated in an ablation. Please use main.py instead.")
+
+    try:
+        variants, histories = asyncio.run(run_ablation(args))
+    finally:
+        get_recorder().close()
+    interrogator_type = parse_entity(args.interrogator)[0].lower()
+    for index, ((entity, evasion), history) in enumerate(zip(variants, histories)):
+        save_game(interrogator_type, parse_entity(entity)[0].lower(), history, evasion, suffix=f"branch{index}")
+    if get_store():
+        get_store().close()
+
+    print(Fore.MAGENTA + Style.BRIGHT + f"\n{len(histories)} branches after {args.shared_rounds} shared rounds\n")
+    print(Style.BRIGHT + f"{'interrogated':<14}{'evasion':<9}{'rounds':>8}{'verdict':>10}")
+    for (entity, evasion), history in zip(variants, histories):
+        verdict = parse_verdict(history[-1]["final_verdict"]) or "-"
+        print(f"{parse_entity(entity)[0].lower():<14}{str(evasion):<9}{history[-1]['rounds']:>8}{verdict:>10}")
+    print()
+    print_metrics_summary()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import argparse
+import glob
+import json
+import os
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from colorama import Style, init
+
+from models.llm import VERDICT_PATTERN
+from results_store import ResultsStore, message_text
+
+init(autoreset=True)
+
+# Predicted labels, in confusion matrix column order
+LABELS = ("human", "ai", "undecided")
+HUMAN, AI, UNDECIDED = range(3)
+DEFAULT_BOOTSTRAP = 2000
+DEFAULT_CONFIDENCE = 0.95
+
+# The two options restated, e.g. 'I have to choose between "This is a human." and "This is an AI."'
+RESTATED_OPTIONS = re.compile(r"This is (?:a human|an AI)\.\W*(?:or|and)\W*This is (?:a human|an AI)\.", re.IGNORECASE)
+
+_decoder = json.JSONDecoder()
+
+
+def parse_verdict(verdict) -> Optional[str]:
+    """Return 'human' or 'ai' for a final verdict, or None if the interrogator didn't commit to one."""
+    if not isinstance(verdict, str):
+        return None
+    # A decision on its own line wins over the options the interrogator may have restated before it
+    decisions = VERDICT_PATTERN.findall(verdict)
+    if decisions:
+        return "human" if decisions[-1].lower() == "a human" else "ai"
+    verdict = RESTATED_OPTIONS.sub("", verdict).lower()
+    said_human = "this is a human" in verdict
+    said_ai = "this is an ai" in verdict
+    if said_human == said_ai:
+        return None
+    return "human" if said_human else "ai"
+
+
+def _value(text: str, key: str, default=None, last: bool = False):
+    """Decodes the value of a key straight from the raw JSON text, without parsing the rest of the document."""
+    # Quotes inside strings are escaped, so an unescaped '"key": ' is always a key
+    needle = f'"{key}": '
+    position = text.rfind(needle) if last else text.find(needle)
+    if position == -1:
+        return default
+    return message_text(_decoder.raw_decode(text, position + len(needle))[0])
+
+
+def read_log_verdicts(logs_dir: str) -> Iterator[Tuple[str, str, bool, str, int]]:
+    """
+    Yields (interrogator, interrogated, evasion, verdict, rounds) for every logs/conversation_*.json file.
+    Only the few fields needed are decoded, the transcripts are never turned into Python objects.
+    """
+    for path in sorted(glob.glob(os.path.join(logs_dir, "conversation_*.json"))):
+        with open(path) as log_file:
+            text = log_file.read()
+        verdict = _value(text, "final_verdict", last=True)
+        if verdict is None:
+            continue
+        # Logs written before evasion mode was recorded were all played without it
+        yield (_value(text, "interrogator"), _value(text, "interrogated"), _value(text, "evasion", False), verdict,
+               _value(text, "round", 0, last=True))
+
+
+def read_store_verdicts(results_dir: str) -> Iterator[Tuple[str, str, bool, str, int]]:
+    """Yields (interrogator, interrogated, evasion, verdict, rounds) for every game in a results store."""
+    for row in ResultsStore(results_dir, read_only=True).read_rows("verdict"):
+        yield row["interrogator"], row["interrogated"], row["evasion"], row["verdict"], row["rounds"]
+
+
+class VerdictTable:
+    """
+    The verdicts of many games as flat arrays: a cell index, the true label, the predicted label and
+    the number of rounds played per game.
+    """
+
+    def __init__(self, verdicts):
+        self.cells: List[Tuple[str, str, bool]] = []
+        cell_ids: Dict[Tuple[str, str, bool], int] = {}
+        cells, predicted, rounds = [], [], []
+        for interrogator, interrogated, evasion, verdict, played in verdicts:
+            cell = (interrogator, interrogated, bool(evasion))
+            if cell not in cell_ids:
+                cell_ids[cell] = len(self.cells)
+                self.cells.append(cell)
+            cells.append(cell_ids[cell])
+            label = parse_verdict(verdict)
+            predicted.append(UNDECIDED if label is None else LABELS.index(label))
+            rounds.append(played)
+        self.cell = np.array(cells, dtype=np.int32)
+        self.predicted = np.array(predicted, dtype=np.int8)
+        self.rounds = np.array(rounds, dtype=np.int16)
+        cell_truth = np.array([HUMAN if interrogated.lower() == "human" else AI
+                               for _, interrogated, _ in self.cells], dtype=np.int8)
+        self.truth = cell_truth[self.cell] if len(self.cell) else np.zeros(0, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.cell)
+
+    def confusion_matrices(self) -> np.ndarray:
+        """Array of shape (cells, 2, 3): true label (human, ai) x predicted label (human, ai, undecided)."""
+        flat = self.cell.astype(np.int64) * 6 + self.truth * 3 + self.predicted
+        return np.bincount(flat, minlength=len(self.cells) * 6).reshape(len(self.cells), 2, 3)
+
+    def accuracy(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Correct and decided games per cell, and the detection accuracy over the decided games (NaN if none)."""
+        matrices = self.confusion_matrices()
+        correct = matrices[:, HUMAN, HUMAN] + matrices[:, AI, AI]
+        decided = matrices[:, :, :UNDECIDED].sum(axis=(1, 2))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return correct, decided, correct / decided
+
+    def mean_rounds(self) -> np.ndarray:
+        """Average number of rounds per game of every cell, the cost side of early verdicts."""
+        games = np.bincount(self.cell, minlength=len(self.cells))
+        return np.bincount(self.cell, weights=self.rounds, minlength=len(self.cells)) / np.maximum(games, 1)
+
+    def bootstrap(self, resamples: int = DEFAULT_BOOTSTRAP, confidence: float = DEFAULT_CONFIDENCE,
+                  seed: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Percentile bootstrap confidence interval of every cell's accuracy.
+
+        Resampling n correct/incorrect outcomes with replacement and counting the correct ones is a
+        Binomial(n, accuracy) draw, so all cells are resampled at once without materializing the games.
+        """
+        correct, decided, accuracy = self.accuracy()
+        rng = np.random.default_rng(seed)
+        draws = rng.binomial(decided, np.nan_to_num(accuracy), size=(resamples, len(self.cells)))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            resampled = draws / decided
+        tail = (1 - confidence) / 2 * 100
+        low, high = np.percentile(resampled, [tail, 100 - tail], axis=0)
+        return low, high
+
+
+def print_report(table: VerdictTable, resamples: int, confidence: float, seed: Optional[int] = None):
+    """Print accuracy, its confidence interval and the confusion matrix of every cell."""
+    matrices = table.confusion_matrices()
+    correct, decided, accuracy = table.accuracy()
+    low, high = table.bootstrap(resamples, confidence, seed)
+    rounds = table.mean_rounds()
+    interval = f"{confidence:.0%} CI"
+    print(Style.BRIGHT + f"{'interrogator':<14}{'interrogated':<14}{'evasion':<9}{'games':>7}{'rounds':>8}{'human':>7}"
+                         f"{'ai':>7}{'undecided':>11}{'accuracy':>10}{interval:>15}")
+    for index in sorted(range(len(table.cells)), key=lambda i: table.cells[i]):
+        interrogator, interrogated, evasion = table.cells[index]
+        said = matrices[index].sum(axis=0)
+        if decided[index]:
+            score = f"{accuracy[index]:.1%}"
+            bounds = f"{low[index]:.1%}-{high[index]:.1%}"
+        else:
+            score = bounds = "-"
+        print(f"{interrogator:<14}{interrogated:<14}{str(evasion):<9}{matrices[index].sum():>7}{rounds[index]:>8.2f}"
+              f"{said[HUMAN]:>7}{said[AI]:>7}{said[UNDECIDED]:>11}{score:>10}{bounds:>15}")
+    total = matrices.sum(axis=0)
+    print(Style.BRIGHT + f"\nConfusion matrix over all {len(table)} games (rows: truth, columns: verdict)")
+    print(f"{'':<8}" + "".join(f"{label:>11}" for label in LABELS))
+    for truth, row in zip(("human", "ai"), total):
+        print(f"{truth:<8}" + "".join(f"{count:>11}" for count in row))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="main.py analyze",
+        description="Aggregate the final verdicts per (interrogator, interrogated, evasion).",
+        epilog="Example:\n"
+               "  python3 main.py analyze --logs=logs\n"
+               "  python3 main.py analyze --results=results --bootstrap=5000\n",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--logs", default="logs", help="Directory with the conversation_*.json logs (default).")
+    source.add_argument("--results", help="Directory of a results store, see --results-dir.")
+    parser.add_argument("--bootstrap", type=int, default=DEFAULT_BOOTSTRAP, help="Number of bootstrap resamples.")
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE,
+                        help="Confidence level of the intervals.")
+    parser.add_argument("--seed", type=int, help="Seed of the bootstrap, for reproducible intervals.")
+    args = parser.parse_args(argv)
+    # A mistyped directory would otherwise read as one without any games
+    directory = args.results or args.logs
+    if not os.path.isdir(directory):
+        parser.error(f"No such directory: {directory}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    verdicts = read_store_verdicts(args.results) if args.results else read_log_verdicts(args.logs)
+    table = VerdictTable(verdicts)
+    if not len(table):
+        print(f"No games found in {args.results or args.logs}")
+        return
+    print_report(table, args.bootstrap, args.confidence, args.seed)
+
+
+if __name__ == "__main__":
+    main()
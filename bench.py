@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+from typing import List
+
+from colorama import Style, init
+
+from main import arun_conversation, parse_question_count
+from models.mock import configure_mock
+from models.prompts import NUMBER_OF_QUESTIONS
+from models.registry import clients, create_handler
+from models.scheduler import RateLimit, Scheduler, get_scheduler
+
+init(autoreset=True)
+
+DEFAULT_CONCURRENCY = [1, 8, 64, 256]
+
+
+async def play_games(games: int, concurrency: int, num_questions: int) -> float:
+    """Plays mock games with at most `concurrency` in flight and returns the elapsed seconds."""
+    slots = asyncio.Semaphore(concurrency)
+
+    async def play():
+        async with slots:
+            interrogator = create_handler("mock", "interrogator", False, False, num_questions=num_questions)
+            interrogated = create_handler("mock", "interrogated", False, False, num_questions=num_questions)
+            await arun_conversation(interrogator, interrogated, num_questions, verbose=False)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(play() for _ in range(games)))
+    elapsed = time.perf_counter() - start
+    await clients.aclose()
+    return elapsed
+
+
+def measure_throughput(concurrency: int, games: int, num_questions: int) -> float:
+    """End-to-end games per second."""
+    return games / asyncio.run(play_games(games, concurrency, num_questions))
+
+
+def measure_memory(concurrency: int, num_questions: int) -> float:
+    """Peak memory in KiB per in-flight conversation, with `concurrency` games all running at once."""
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    asyncio.run(play_games(concurrency, concurrency, num_questions))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return (peak - baseline) / concurrency / 1024
+
+
+def measure_scheduler_overhead(calls: int) -> List[float]:
+    """Microseconds Scheduler.acall adds to a call that returns at once, without and with a rate limit."""
+
+    async def noop():
+        return None
+
+    async def timed(call) -> float:
+        start = time.perf_counter()
+        for _ in range(calls):
+            await call()
+        return (time.perf_counter() - start) / calls * 1e6
+
+    async def run() -> List[float]:
+        direct = await timed(noop)
+        unlimited = Scheduler()
+        limited = Scheduler({"mock": RateLimit(requests_per_minute=1e12, tokens_per_minute=1e15)})
+        return [await timed(lambda: unlimited.acall("mock/mock", noop, 1000)) - direct,
+                await timed(lambda: limited.acall("mock/mock", noop, 1000)) - direct]
+
+    return asyncio.run(run())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark games per second, scheduler overhead and memory per conversation with the mock provider.",
+        epilog="Example:\n"
+               "  python3 bench.py --concurrency 1 16 256 --latency lognormal:0.2:0.5 | tee bench_output.txt\n",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY,
+                        help="Numbers of games in flight to measure.")
+    parser.add_argument("--games", type=int, help="Games per concurrency level (default: 4 times the concurrency, "
+                                                  "at least 32).")
+    parser.add_argument("--questions", type=parse_question_count, default=NUMBER_OF_QUESTIONS, help="Questions per game.")
+    parser.add_argument("--latency", default="fixed:0.02",
+                        help="Latency distribution of every mock call (default: fixed:0.02), see --mock-latency.")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Share of mock calls that time out.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of mock calls answered with a 429.")
+    parser.add_argument("--scheduler-calls", type=int, default=20000,
+                        help="Calls to time for the scheduler overhead.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the mock provider.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # Injected errors are retried quickly, so they cost retries rather than back-off time
+    get_scheduler().retry_policy.base_delay = 0.01
+    configure_mock(latency=args.latency, timeout_rate=args.timeout_rate, rate_limit_rate=args.rate_limit_rate,
+                   seed=args.seed)
+
+    unlimited, limited = measure_scheduler_overhead(args.scheduler_calls)
+    print(Style.BRIGHT + "Scheduler overhead per call")
+    print(f"  without limits: {unlimited:.1f}us\n  with RPM/TPM limits: {limited:.1f}us\n")
+
+    print(Style.BRIGHT + f"{'concurrency':>12}{'games':>8}{'games/s':>10}{'calls/s':>10}{'KiB/game':>10}")
+    calls_per_game = 2 * args.questions + 1
+    for concurrency in args.concurrency:
+        games = args.games or max(32, 4 * concurrency)
+        games_per_second = measure_throughput(concurrency, games, args.questions)
+        memory = measure_memory(concurrency, args.questions)
+        print(f"{concurrency:>12}{games:>8}{games_per_second:>10.1f}{games_per_second * calls_per_game:>10.0f}"
+              f"{memory:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
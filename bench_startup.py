@@ -0,0 +1,109 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, NamedTuple, Tuple
+
+from colorama import Fore, Style, init
+
+init(autoreset=True)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# SDKs and libraries only the providers that use them may import
+HEAVY_MODULES = ("anthropic", "openai", "google", "transformers", "torch", "numpy", "aiohttp")
+DEFAULT_BUDGET_MS = 150.0
+IMPORT_TIME_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+class Import(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def run(args: List[str], cwd: str) -> Tuple[float, List[Import]]:
+    """Runs `python -X importtime <args>` and returns its wall time in seconds and the imports it made."""
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=cwd, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    if process.returncode:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{process.stderr[-2000:]}")
+    imports = [Import(match[4], int(match[1]), int(match[2]), len(match[3]) // 2)
+               for match in IMPORT_TIME_PATTERN.finditer(process.stderr)]
+    return elapsed, imports
+
+
+def program_imports(imports: List[Import], baseline: List[Import]) -> List[Import]:
+    """The imports that the interpreter doesn't make on its own, i.e. the ones the program is paying for."""
+    interpreter = {record.module for record in baseline}
+    return [record for record in imports if record.module not in interpreter]
+
+
+def measure(name: str, args: List[str], baseline: List[Import], cwd: str, repeat: int) -> Dict:
+    """Median wall and import time of a command over `repeat` runs, with the imports of the last run."""
+    walls, import_times = [], []
+    for _ in range(repeat):
+        wall, imports = run(args, cwd)
+        imports = program_imports(imports, baseline)
+        walls.append(wall)
+        import_times.append(sum(record.self_us for record in imports) / 1000)
+    heavy = sorted({record.module for record in imports if record.module.split(".")[0] in HEAVY_MODULES})
+    return {"name": name, "wall_ms": statistics.median(walls) * 1000,
+            "import_ms": statistics.median(import_times), "imports": imports, "heavy": heavy}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the CLI startup: the import time of main.py --help and of a one-question mock game, "
+                    "checked against a budget. Exits with an error if a run is over budget or imports a provider SDK.",
+        epilog="Example:\n"
+               "  python3 bench_startup.py --budget-ms 120 --repeat 10\n",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"Import time budget of every run in milliseconds, on top of the interpreter's own "
+                             f"(default: {DEFAULT_BUDGET_MS:.0f}).")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per command, the median is reported.")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list per command.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    main_py = os.path.join(ROOT, "main.py")
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = run(["-c", "pass"], directory)[1]
+        runs = [
+            measure("main.py --help", [main_py, "--help"], baseline, directory, args.repeat),
+            # The game is saved to a results store in the temporary directory, not to logs/
+            measure("main.py mock game", [main_py, "--interrogator", "mock", "--interrogated", "mock",
+                                          "--questions", "1", "--results-dir", "results"],
+                    baseline, directory, args.repeat),
+        ]
+
+    for result in runs:
+        over = result["import_ms"] > args.budget_ms
+        failed |= over or bool(result["heavy"])
+        color = Fore.RED if over else Fore.GREEN
+        print(Style.BRIGHT + result["name"])
+        print(f"  wall time: {result['wall_ms']:.0f}ms")
+        print(color + f"  import time: {result['import_ms']:.1f}ms (budget {args.budget_ms:.0f}ms)")
+        if result["heavy"]:
+            print(Fore.RED + f"  imports provider SDKs: {', '.join(result['heavy'])}")
+        print("  slowest top-level imports:")
+        top_level = [record for record in result["imports"] if record.depth == 0]
+        for record in sorted(top_level, key=lambda record: -record.cumulative_us)[:args.top]:
+            print(f"    {record.cumulative_us / 1000:>7.1f}ms  {record.module}")
+        print()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
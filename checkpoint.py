@@ -0,0 +1,103 @@
+import json
+import os
+from typing import Dict, Optional
+
+from models.conversation import Conversation
+from models.prompts import get_prompt_set
+
+
+def _encode(value):
+    # Handler states share their immutable conversations, they are written as lists of messages
+    if isinstance(value, Conversation):
+        return value.to_dicts()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class CheckpointMismatch(ValueError):
+    """A checkpoint saved by a game with other settings than the one that would resume it."""
+
+
+def game_settings(num_questions: int, confidence_threshold: Optional[float] = None) -> Dict:
+    """The settings that shape a game's calls, a checkpoint is only resumed by a game with the same ones."""
+    return {"questions": num_questions, "prompt_set": get_prompt_set().name,
+            "confidence_threshold": confidence_threshold}
+
+
+class Checkpoint:
+    """
+    The state of one game on disk, rewritten after every completed call: the rounds played so far,
+    the interrogator's last unanswered message and both handlers' histories.
+
+    A game resumed from its checkpoint continues with the next call, so no call that already
+    completed is made (and billed) again. The checkpoint keeps the game's settings (see game_settings),
+    and a game with other settings refuses to resume it.
+
+    Raises:
+        CheckpointMismatch: If the saved game was played with other settings.
+    """
+
+    def __init__(self, path: str, settings: Optional[Dict] = None):
+        self.path = path
+        self.settings = settings
+        self.state: Optional[Dict] = None
+        if os.path.exists(path):
+            with open(path) as checkpoint_file:
+                self.state = json.load(checkpoint_file)
+        saved = (self.state or {}).get("settings")
+        if settings is not None and saved is not None and saved != settings:
+            changed = ", ".join(f"{key} {saved.get(key)!r} (now {value!r})" for key, value in settings.items()
+                                if saved.get(key) != value)
+            raise CheckpointMismatch(f"{path} was saved by a game with {changed}. Please re-run it with the same "
+                                     f"settings, or delete the checkpoint to start over.")
+
+    @property
+    def finished(self) -> bool:
+        return bool(self.state and self.state.get("finished"))
+
+    def save(self, state: Dict):
+        """Replaces the checkpoint atomically, a crash mid-write leaves the previous one in place."""
+        if self.settings is not None:
+            state = {**state, "settings": self.settings}
+        self.state = state
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as checkpoint_file:
+            json.dump(state, checkpoint_file, default=_encode)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temporary, self.path)
+
+    def finish(self, history):
+        """Keeps the finished game's history, so a resumed batch skips the game."""
+        self.save({"finished": True, "history": history})
+
+    def clear(self):
+        self.state = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Snapshot:
+    """
+    In-memory counterpart of Checkpoint: the state of a game at a point it can be continued from.
+    Forking is O(1), the branches share the rounds played so far and the handlers' conversations.
+    """
+
+    def __init__(self, state: Optional[Dict] = None):
+        self.state = state
+
+    def save(self, state: Dict):
+        self.state = state
+
+    def fork(self) -> "Snapshot":
+        return Snapshot(dict(self.state))
+
+
+def checkpoint_path(checkpoint_dir: str, interrogator_type: str, interrogated_type: str, evasion: bool,
+                    suffix: str = "") -> str:
+    """The checkpoint file of a game, named after what is played rather than when, so a re-run finds it."""
+    suffix = f"_{suffix}" if suffix else ""
+    evasion = "_evasion" if evasion else ""
+    return os.path.join(checkpoint_dir, f"{interrogator_type}_vs_{interrogated_type}{evasion}{suffix}.json")
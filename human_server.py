@@ -0,0 +1,303 @@
+import argparse
+import asyncio
+import itertools
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from aiohttp import WSMsgType, web
+from colorama import Fore, Style, init
+
+from analysis import parse_verdict
+from main import (
+    acreate_handler,
+    acreate_jurors,
+    add_run_args,
+    arun_conversation,
+    configure_run,
+    parse_entity,
+    print_metrics_summary,
+    reject_humans,
+    save_game,
+)
+from models.llm import RemoteHumanHandler
+from models.metrics import get_recorder
+from models.prompts import NUMBER_OF_QUESTIONS
+from models.registry import clients
+from results_store import get_store
+
+init(autoreset=True)
+
+DEFAULT_MAX_SESSIONS = 32
+DEFAULT_RESPONSE_TIMEOUT = 300.0
+DEFAULT_SESSION_TIMEOUT = 1800.0
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Reverse Turing Test</title>
+<style>
+  body { font-family: sans-serif; max-width: 720px; margin: 2em auto; }
+  #log p { white-space: pre-wrap; }
+  .question { color: #06c; }
+  .answer { color: #080; }
+  .status { color: #888; font-style: italic; }
+  textarea { width: 100%; height: 6em; }
+</style>
+</head>
+<body>
+<h1>Reverse Turing Test</h1>
+<p class="status">An interrogator will ask you a few questions. Answer them as yourself.</p>
+<div id="log"></div>
+<form id="form">
+  <textarea id="answer" disabled></textarea>
+  <button id="send" disabled>Send</button>
+</form>
+<script>
+  const log = document.getElementById("log");
+  const answer = document.getElementById("answer");
+  const send = document.getElementById("send");
+  function say(text, kind) {
+    const line = document.createElement("p");
+    line.className = kind;
+    line.textContent = text;
+    log.appendChild(line);
+    window.scrollTo(0, document.body.scrollHeight);
+  }
+  function ready(enabled) {
+    answer.disabled = send.disabled = !enabled;
+    if (enabled) answer.focus();
+  }
+  const socket = new WebSocket((location.protocol === "https:" ? "wss://" : "ws://") + location.host + "/ws");
+  socket.onmessage = (event) => {
+    const message = JSON.parse(event.data);
+    if (message.type === "question") {
+      say("[Round " + message.round + "] " + message.text, "question");
+      ready(true);
+    } else {
+      say(message.text, "status");
+      ready(false);
+    }
+  };
+  socket.onclose = () => ready(false);
+  document.getElementById("form").onsubmit = (event) => {
+    event.preventDefault();
+    if (!answer.value.trim()) return;
+    socket.send(JSON.stringify({type: "answer", text: answer.value}));
+    say(answer.value, "answer");
+    answer.value = "";
+    ready(false);
+  };
+</script>
+</body>
+</html>
+"""
+
+
+@dataclass
+class Session:
+    """One participant's game."""
+    session_id: str
+    interrogator: str
+    human: RemoteHumanHandler
+    started: float = field(default_factory=time.monotonic)
+    rounds: int = 0
+
+
+class SessionManager:
+    """
+    Plays the games of all connected participants on one event loop: while a participant is typing,
+    the other sessions and their interrogators keep going. Interrogators are assigned round-robin.
+    """
+
+    def __init__(self, interrogators: List[str], test_mode: bool = False, num_questions: int = NUMBER_OF_QUESTIONS,
+                 confidence_threshold: Optional[float] = None, jury: List[str] = (),
+                 max_sessions: int = DEFAULT_MAX_SESSIONS, response_timeout: Optional[float] = DEFAULT_RESPONSE_TIMEOUT,
+                 session_timeout: Optional[float] = DEFAULT_SESSION_TIMEOUT):
+        self.interrogators = itertools.cycle(interrogators)
+        self.test_mode = test_mode
+        self.num_questions = num_questions
+        self.confidence_threshold = confidence_threshold
+        self.jury = jury
+        self.max_sessions = max_sessions
+        self.response_timeout = response_timeout
+        self.session_timeout = session_timeout
+        self.sessions: Dict[str, Session] = {}
+
+    @property
+    def full(self) -> bool:
+        return len(self.sessions) >= self.max_sessions
+
+    def open(self, send_json) -> Session:
+        """Registers a participant. send_json delivers a message to their browser."""
+        session_id = uuid.uuid4().hex[:12]
+
+        async def send_question(question: str):
+            session.rounds += 1
+            await send_json({"type": "question", "round": session.rounds, "text": question})
+
+        session = Session(session_id, next(self.interrogators), RemoteHumanHandler(send_question,
+                                                                                   self.response_timeout))
+        self.sessions[session_id] = session
+        return session
+
+    async def play(self, session: Session) -> Dict:
+        """
+        Plays the session's game and saves it like main.py does.
+
+        Returns:
+            Dict: The message that tells the participant how the session ended.
+        """
+        interrogator_type, interrogator_key = parse_entity(session.interrogator)
+        interrogator_type = interrogator_type.lower()
+        adaptive = self.confidence_threshold is not None
+        try:
+            interrogator = await acreate_handler(interrogator_type, "interrogator", self.test_mode, False,
+                                                 interrogator_key, self.num_questions, adaptive)
+            jurors = await acreate_jurors(self.jury, self.test_mode, False, self.num_questions)
+            history = await asyncio.wait_for(
+                arun_conversation(interrogator, session.human, self.num_questions, verbose=False,
+                                  confidence_threshold=self.confidence_threshold, jurors=jurors),
+                self.session_timeout,
+            )
+        except asyncio.TimeoutError:
+            print(Fore.RED + f"[{session.session_id}] {interrogator_type} vs human timed out after "
+                             f"{session.rounds} questions")
+            return {"type": "timeout", "text": "The session has timed out. Thank you for taking part!"}
+        except Exception as e:
+            print(Fore.RED + f"[{session.session_id}] {interrogator_type} vs human failed: {e}")
+            return {"type": "error", "text": "Something went wrong, the session has ended. Sorry!"}
+        finally:
+            del self.sessions[session.session_id]
+
+        save_game(interrogator_type, "human", history, suffix=session.session_id)
+        print(f"[{session.session_id}] {interrogator_type} vs human in {time.monotonic() - session.started:.0f}s - "
+              f"verdict: {parse_verdict(history[-1]['final_verdict'])} ({len(self.sessions)} sessions open)")
+        return {"type": "end", "text": f"The conversation has ended.\n"
+                                       f"Final verdict from the interrogator: {history[-1]['final_verdict']}"}
+
+
+async def index(request: web.Request) -> web.Response:
+    return web.Response(text=PAGE, content_type="text/html")
+
+
+async def read_answers(ws: web.WebSocketResponse, session: Session):
+    """Hands the participant's answers to their game until the browser disconnects."""
+    async for message in ws:
+        if message.type != WSMsgType.TEXT:
+            continue
+        try:
+            data = json.loads(message.data)
+        except ValueError:
+            continue
+        if data.get("type") == "answer" and isinstance(data.get("text"), str):
+            session.human.answer(data["text"])
+
+
+async def websocket(request: web.Request) -> web.WebSocketResponse:
+    """One participant's session: questions go out as JSON messages, answers come back the same way."""
+    manager: SessionManager = request.app["sessions"]
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    if manager.full:
+        await ws.send_json({"type": "busy", "text": "All sessions are taken, please try again later."})
+        await ws.close()
+        return ws
+
+    session = manager.open(ws.send_json)
+    print(Fore.BLUE + f"[{session.session_id}] {parse_entity(session.interrogator)[0].lower()} vs human started "
+                      f"({len(manager.sessions)} sessions open)")
+    game = asyncio.create_task(manager.play(session))
+    reader = asyncio.create_task(read_answers(ws, session))
+    await asyncio.wait([game, reader], return_when=asyncio.FIRST_COMPLETED)
+    reader.cancel()
+    if not game.done():
+        # The participant left, their game is abandoned
+        game.cancel()
+        print(Fore.RED + f"[{session.session_id}] The participant disconnected after {session.rounds} questions")
+        await asyncio.gather(game, return_exceptions=True)
+    elif not ws.closed:
+        await ws.send_json(game.result())
+        await ws.close()
+    return ws
+
+
+async def close_clients(app: web.Application):
+    await clients.aclose()
+
+
+def create_app(manager: SessionManager) -> web.Application:
+    app = web.Application()
+    app["sessions"] = manager
+    app.router.add_get("/", index)
+    app.router.add_get("/ws", websocket)
+    app.on_cleanup.append(close_clients)
+    return app
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Serve a local web page where many human participants are interrogated at once.",
+        epilog="Example:\n"
+               "  python3 human_server.py --interrogators claude::KEY openai::KEY --port 8080 --max-sessions 50\n",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "--interrogators",
+        nargs="+",
+        required=True,
+        help="Interrogators in the format: gemini/llama/claude/openai/mock::<API_KEY>, assigned to the "
+             "participants in turn.",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080).")
+    parser.add_argument(
+        "--max-sessions",
+        type=int,
+        default=DEFAULT_MAX_SESSIONS,
+        help=f"Maximum number of participants playing at once (default: {DEFAULT_MAX_SESSIONS}).",
+    )
+    parser.add_argument(
+        "--response-timeout",
+        type=float,
+        default=DEFAULT_RESPONSE_TIMEOUT,
+        help=f"Seconds a participant has to answer a question (default: {DEFAULT_RESPONSE_TIMEOUT:.0f}).",
+    )
+    parser.add_argument(
+        "--session-timeout",
+        type=float,
+        default=DEFAULT_SESSION_TIMEOUT,
+        help=f"Seconds a whole session may take (default: {DEFAULT_SESSION_TIMEOUT:.0f}).",
+    )
+    parser.add_argument(
+        "--test",
+        action="store_true",
+        help="Use the cheap models for every LLM.",
+    )
+    add_run_args(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure_run(args)
+    reject_humans(args.interrogators, "Humans can't be interrogators. Please use gemini/llama/claude/openai/mock.")
+    manager = SessionManager(args.interrogators, args.test, args.questions, args.confidence_threshold, args.jury,
+                             args.max_sessions, args.response_timeout, args.session_timeout)
+
+    print(Fore.BLUE + Style.BRIGHT + f"Participants can join at http://{args.host}:{args.port}/\n")
+    try:
+        web.run_app(create_app(manager), host=args.host, port=args.port, print=None)
+    finally:
+        get_recorder().close()
+        if get_store():
+            get_store().close()
+    print()
+    print_metrics_summary()
+
+
+if __name__ == "__main__":
+    main()
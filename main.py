@@ -1,31 +1,50 @@
 import argparse
+import asyncio
 from colorama import Fore, Style, init
 import os
 import datetime
 import json
+import sys
 
-init(autoreset=True)
+from models.batch import BATCH_MODES, DEFAULT_POLL_INTERVAL, Batcher, batch_game, set_batcher
+from models.cache import CACHE_MODES, ResponseCache, cache_sample, set_cache
+from models.llama import CPU_STAND_IN_MODEL, configure_llama, settings as llama_settings
+from models.llm import run_sync, set_max_game_cost, split_confidence
+from models.mock import configure_mock
+from models.metrics import JsonlMetricsSink, MetricsRecorder, PrometheusMetricsSink, get_recorder, set_recorder
+from models.prompts import (
+    DEFAULT_PROMPT_SET,
+    NUMBER_OF_QUESTIONS,
+    available_prompt_sets,
+    load_prompt_set,
+    set_prompt_set,
+)
+from models.registry import create_handler
+from models.scheduler import RetryPolicy, Scheduler, parse_rate_limit, set_scheduler
+from checkpoint import Checkpoint, Snapshot, checkpoint_path, game_settings
+from results_store import ResultsStore, get_store, set_store
 
-NUMBER_OF_QUESTIONS = 5
+init(autoreset=True)
 
 
 def parse_args():
     parser = argparse.ArgumentParser(
         description="Simulate a conversation between two entities (LLM or human).",
         epilog="Example:\n"
-               "  python3 main.py --interrogator=openai::API_KEY --interrogated=human\n",
+               "  python3 main.py --interrogator=openai::API_KEY --interrogated=human\n"
+               "  python3 main.py analyze --logs=logs\n",
         formatter_class=argparse.RawTextHelpFormatter
     )
     parser.add_argument(
         "--interrogator",
         required=True,
-        help="Specify the interrogator in the format: gemini/llama/claude/openai::<API_KEY>. "
+        help="Specify the interrogator in the format: gemini/llama/claude/openai/mock::<API_KEY>. "
              "If it's a human, use 'human'.",
     )
     parser.add_argument(
         "--interrogated",
         required=True,
-        help="Specify the interrogated in the format: gemini/llama/claude/openai/human::<API_KEY>. "
+        help="Specify the interrogated in the format: gemini/llama/claude/openai/mock/human::<API_KEY>. "
              "If it's a human, use 'human'.",
     )
     parser.add_argument(
@@ -39,9 +58,307 @@ def parse_args():
         action="store_true",
         help="Run the script in evasion mode. The interrogated is aware that it's a test, and tries to actively evade.",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Render responses as they're generated, and stop the final verdict as soon as the decision is given.",
+    )
+    add_run_args(parser, checkpoint=True)
     return parser.parse_args()
 
 
+def parse_probability(value: str) -> float:
+    probability = float(value)
+    if not 0 < probability <= 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a probability in (0, 1].")
+    return probability
+
+
+def parse_question_count(value: str) -> int:
+    count = int(value)
+    if count < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a number of questions, a game has at least one.")
+    return count
+
+
+def add_game_args(parser):
+    parser.add_argument(
+        "--questions",
+        type=parse_question_count,
+        default=NUMBER_OF_QUESTIONS,
+        help=f"Maximum number of questions the interrogator can ask (default: {NUMBER_OF_QUESTIONS}).",
+    )
+    parser.add_argument(
+        "--confidence-threshold",
+        type=parse_probability,
+        metavar="P",
+        help="Adaptive mode: the interrogator reports its confidence with every question, and gives its verdict "
+             "as soon as the confidence reaches P (0-1), before the last round if it can.",
+    )
+    parser.add_argument(
+        "--prompt-set",
+        default=DEFAULT_PROMPT_SET,
+        metavar="NAME",
+        help=f"Prompts of both roles: {'/'.join(available_prompt_sets())} (the files in prompts/), or a path to "
+             f"a JSON file in the same format (default: {DEFAULT_PROMPT_SET}).",
+    )
+    parser.add_argument(
+        "--max-game-cost",
+        type=float,
+        metavar="USD",
+        help="Refuse to start a game if a model's requests in it can cost more than USD, estimated from the prompt "
+             "set's token counts with every response at its maximum length (OpenAI, Claude and Gemini models).",
+    )
+
+
+def configure_game(args):
+    set_prompt_set(load_prompt_set(args.prompt_set))
+    set_max_game_cost(args.max_game_cost)
+
+
+def add_jury_args(parser):
+    parser.add_argument(
+        "--jury",
+        nargs="+",
+        metavar="ENTITY",
+        default=[],
+        help="Interrogators (gemini/llama/claude/openai/mock::<API_KEY>) that each give their own verdict on the "
+             "transcript once the game has ended, all at once.",
+    )
+
+
+def create_jurors(entities, test_mode, evasion, num_questions):
+    """Create a juror - an interrogator that only gives a verdict - for every entity of the jury."""
+    jurors = []
+    for entity in entities:
+        entity_type, api_key = parse_entity(entity)
+        jurors.append(create_handler(entity_type, "interrogator", test_mode, evasion, api_key, num_questions))
+    return jurors
+
+
+def add_scheduler_args(parser):
+    parser.add_argument(
+        "--rate-limit",
+        action="append",
+        default=[],
+        metavar="PROVIDER[/MODEL]=RPM:TPM",
+        help="Requests and tokens per minute budget for a provider or a single model, e.g. claude=50:40000 "
+             "or openai/gpt-4o=:30000. Can be repeated.",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=RetryPolicy.max_retries,
+        help="Number of times a transient provider error (timeout, 429, 5xx) is retried before giving up.",
+    )
+
+
+def add_cache_args(parser):
+    parser.add_argument(
+        "--cache",
+        metavar="PATH",
+        help="Cache model responses in this SQLite file, identical requests are answered from the cache.",
+    )
+    parser.add_argument(
+        "--cache-mode",
+        choices=CACHE_MODES,
+        default="readwrite",
+        help="readwrite: call the provider on a miss and store the response. "
+             "replay: never call a provider, fail on a miss - for offline and deterministic re-runs.",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        help="Ignore cached responses older than this many seconds.",
+    )
+    parser.add_argument(
+        "--cache-max-entries",
+        type=int,
+        help="Evict the least recently used responses beyond this many entries.",
+    )
+
+
+def configure_cache(args):
+    if args.cache:
+        set_cache(ResponseCache(args.cache, args.cache_mode, args.cache_ttl, args.cache_max_entries))
+    elif args.cache_mode == "replay":
+        raise ValueError("Replay mode needs a cache, please pass --cache=<PATH>.")
+
+
+def add_llama_args(parser):
+    parser.add_argument(
+        "--llama-model",
+        default=llama_settings.model_name,
+        help=f"Hugging Face model served for 'llama' entities. Use {CPU_STAND_IN_MODEL} on CPU-only boxes.",
+    )
+    parser.add_argument(
+        "--llama-device",
+        help="Device for the local model, e.g. cuda:0 or cpu. Defaults to the first GPU if there is one.",
+    )
+    parser.add_argument(
+        "--llama-batch-size",
+        type=int,
+        default=llama_settings.max_batch_size,
+        help="Maximum number of conversations generated together in one padded batch.",
+    )
+    parser.add_argument(
+        "--llama-batch-wait",
+        type=float,
+        default=llama_settings.max_wait,
+        help="Seconds to wait for more requests before running a partial batch.",
+    )
+    parser.add_argument(
+        "--llama-prefix-cache",
+        action="store_true",
+        help="Keep each conversation's KV cache between turns so only new messages are encoded. "
+             "Requests then run one at a time instead of in batches - use it with few concurrent games.",
+    )
+
+
+def configure_llama_service(args):
+    configure_llama(model_name=args.llama_model, device=args.llama_device,
+                    max_batch_size=args.llama_batch_size, max_wait=args.llama_batch_wait,
+                    prefix_cache=args.llama_prefix_cache)
+
+
+def add_mock_args(parser):
+    parser.add_argument(
+        "--mock-latency",
+        metavar="DISTRIBUTION",
+        help="Latency of the mock provider: fixed:S, uniform:LOW:HIGH, normal:MEAN:STD, lognormal:MEDIAN:SIGMA "
+             "or exponential:MEAN (default: fixed:0).",
+    )
+    parser.add_argument(
+        "--mock-timeout-rate",
+        type=float,
+        metavar="P",
+        help="Share of mock calls that time out.",
+    )
+    parser.add_argument(
+        "--mock-rate-limit-rate",
+        type=float,
+        metavar="P",
+        help="Share of mock calls rejected with a 429.",
+    )
+    parser.add_argument(
+        "--mock-human-rate",
+        type=float,
+        metavar="P",
+        help="Share of mock verdicts that say 'This is a human.' (default: 0.5).",
+    )
+    parser.add_argument(
+        "--mock-responses",
+        metavar="PATH",
+        help="JSON file with mock response templates (start/middle/human/ai/interrogated lists, {round} is filled in).",
+    )
+    parser.add_argument(
+        "--mock-seed",
+        type=int,
+        help="Seed of the mock provider, for reproducible responses, latencies and errors.",
+    )
+
+
+def configure_mock_provider(args):
+    configure_mock(latency=args.mock_latency, timeout_rate=args.mock_timeout_rate,
+                   rate_limit_rate=args.mock_rate_limit_rate, human_rate=args.mock_human_rate,
+                   responses=args.mock_responses, seed=args.mock_seed)
+
+
+def add_metrics_args(parser):
+    parser.add_argument(
+        "--metrics-jsonl",
+        metavar="PATH",
+        help="Append the latency, token counts and retries of every model call to this JSONL file.",
+    )
+    parser.add_argument(
+        "--metrics-prom",
+        metavar="PATH",
+        help="Keep per-model counters and latency summaries in this file, in the Prometheus text format.",
+    )
+
+
+def configure_metrics(args):
+    sinks = []
+    if args.metrics_jsonl:
+        sinks.append(JsonlMetricsSink(args.metrics_jsonl))
+    if args.metrics_prom:
+        sinks.append(PrometheusMetricsSink(args.metrics_prom))
+    set_recorder(MetricsRecorder(sinks))
+
+
+def print_metrics_summary():
+    """Print p50/p95 latency and token totals per model, for every call made in this process."""
+    summary = get_recorder().summary()
+    if not summary:
+        return
+    seconds = lambda value: f"{value:.2f}s" if value is not None else "-"
+    print(Style.BRIGHT + f"{'model':<40}{'calls':>7}{'errors':>8}{'retries':>9}{'p50':>9}{'p95':>9}"
+                         f"{'ttft p50':>10}{'ttft p95':>10}{'input':>10}{'cached':>10}{'output':>10}")
+    for model, stats in summary.items():
+        print(f"{model:<40}{stats['calls']:>7}{stats['errors']:>8}{stats['retries']:>9}"
+              f"{seconds(stats['wall_time_p50']):>9}{seconds(stats['wall_time_p95']):>9}"
+              f"{seconds(stats['ttft_p50']):>10}{seconds(stats['ttft_p95']):>10}"
+              f"{stats['input_tokens']:>10}{stats['cached_input_tokens']:>10}{stats['output_tokens']:>10}")
+
+
+def add_results_args(parser):
+    parser.add_argument(
+        "--results-dir",
+        metavar="DIR",
+        help="Append games to the results store in this directory instead of writing one JSON log per game.",
+    )
+
+
+def configure_results(args):
+    set_store(ResultsStore(args.results_dir) if args.results_dir else None)
+
+
+def add_checkpoint_args(parser):
+    parser.add_argument(
+        "--checkpoint-dir",
+        metavar="DIR",
+        help="Save every game here after each call, and resume unfinished games from it instead of starting over.",
+    )
+
+
+def add_batch_args(parser):
+    parser.add_argument(
+        "--batch",
+        choices=BATCH_MODES,
+        default="off",
+        help="off: send every call on its own. provider: advance all games by one call per batch job, sent to the "
+             "OpenAI and Anthropic batch APIs (cheaper, slower, not rate limited; other providers are called "
+             "directly). local: send the batch jobs to a file-based stand-in, for tests with the mock provider.",
+    )
+    parser.add_argument(
+        "--batch-dir",
+        metavar="DIR",
+        default="batches",
+        help="Directory of the local batch input and output files (default: batches).",
+    )
+    parser.add_argument(
+        "--batch-poll-interval",
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        help=f"Seconds between checks of a running batch job (default: {DEFAULT_POLL_INTERVAL:.0f}).",
+    )
+
+
+def configure_batch(args):
+    if args.batch == "off":
+        set_batcher(None)
+        return
+    if getattr(args, "stream", False):
+        raise ValueError("Batch jobs can't be streamed, please drop --stream or --batch.")
+    set_batcher(Batcher(args.batch, args.batch_dir, args.batch_poll_interval))
+
+
+def configure_scheduler(args):
+    """Install the scheduler all handlers call through, with the budgets given on the command line."""
+    limits = dict(parse_rate_limit(spec) for spec in args.rate_limit)
+    set_scheduler(Scheduler(limits, RetryPolicy(max_retries=args.max_retries)))
+
+
 def parse_entity(entity: str):
     """Parse the entity string and extract the type and optional API key."""
     parts = entity.split("::")
@@ -50,17 +367,67 @@ def parse_entity(entity: str):
     return entity_type, api_key
 
 
-def save_conversation_log(interrogator_type, interrogated_type, history):
+def reject_humans(entities, message):
+    """Raise a ValueError with the message if any of the entities is a human."""
+    if any(parse_entity(entity)[0].lower() == "human" for entity in entities):
+        raise ValueError(message)
+
+
+async def acreate_handler(*args):
+    """Like create_handler, for callers on the event loop."""
+    # Building a handler can load model weights, keep that off the event loop
+    return await asyncio.to_thread(create_handler, *args)
+
+
+async def acreate_jurors(*args):
+    """Like create_jurors, for callers on the event loop."""
+    return await asyncio.to_thread(create_jurors, *args)
+
+
+def add_run_args(parser, jury=True, checkpoint=False, batch=False):
+    """Add the options every entry point shares, plus the jury, checkpoint and batch ones where they're supported."""
+    add_game_args(parser)
+    if jury:
+        add_jury_args(parser)
+    add_scheduler_args(parser)
+    add_cache_args(parser)
+    add_llama_args(parser)
+    add_mock_args(parser)
+    add_metrics_args(parser)
+    add_results_args(parser)
+    if checkpoint:
+        add_checkpoint_args(parser)
+    if batch:
+        add_batch_args(parser)
+
+
+def configure_run(args):
+    """Set up the process-wide state from the options added by add_run_args."""
+    configure_scheduler(args)
+    configure_cache(args)
+    configure_llama_service(args)
+    configure_mock_provider(args)
+    configure_metrics(args)
+    configure_results(args)
+    if hasattr(args, "batch"):
+        configure_batch(args)
+    configure_game(args)
+
+
+def save_conversation_log(interrogator_type, interrogated_type, history, evasion=False, suffix=""):
     """Save the conversation history to a log file."""
     log_dir = "logs"
     os.makedirs(log_dir, exist_ok=True)
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_filename = f"{log_dir}/conversation_{interrogator_type}_vs_{interrogated_type}_{timestamp}.json"
+    # Concurrent games finish within the same second, the suffix keeps their file names apart
+    suffix = f"_{suffix}" if suffix else ""
+    log_filename = f"{log_dir}/conversation_{interrogator_type}_vs_{interrogated_type}_{timestamp}{suffix}.json"
 
     log_data = {
         "timestamp": timestamp,
         "interrogator": interrogator_type,
         "interrogated": interrogated_type,
+        "evasion": evasion,
         "history": history,
     }
 
@@ -68,46 +435,243 @@ def save_conversation_log(interrogator_type, interrogated_type, history):
         json.dump(log_data, log_file, indent=4)
 
     print(Fore.GREEN + f"Conversation log saved to {log_filename}")
+    return log_filename
+
+
+def save_game(interrogator_type, interrogated_type, history, evasion=False, suffix=""):
+    """Append the game to the results store if there is one, or save it to its own log file otherwise."""
+    store = get_store()
+    if store is None:
+        return save_conversation_log(interrogator_type, interrogated_type, history, evasion, suffix)
+    game_id = store.append_game(interrogator_type, interrogated_type, evasion, history)
+    print(Fore.GREEN + f"Game {game_id} appended to {store.directory}")
+    return game_id
+
+
+def log_token_usage(history, log):
+    """Print how many of the prompt tokens were served from the providers' prefix caches."""
+    usages = [entry.get(key) for entry in history for key in ("interrogator_metrics", "interrogated_metrics")]
+    usages = [usage for usage in usages if usage and usage["input_tokens"] is not None]
+    input_tokens = sum(usage["input_tokens"] for usage in usages)
+    if not input_tokens:
+        return
+    cached = sum(usage["cached_input_tokens"] or 0 for usage in usages)
+    log(Fore.BLUE + f"Input tokens: {input_tokens - cached} fresh, {cached} cached from the prompt prefix "
+                    f"({cached / input_tokens:.0%})\n")
+
+
+def _metrics(handler):
+    """Latency, token counts and retries of the handler's last call."""
+    metrics = getattr(handler, "last_metrics", None)
+    return metrics.to_dict() if metrics else None
+
+
+async def _say(prefix, color, log, stream, send, astream):
+    """Gets a response and prints it, rendering it live as it's generated when streaming."""
+    if not stream:
+        response = await send()
+        log(color + f"{prefix}{response}\n")
+        return response
+    log(color + prefix, end="", flush=True)
+    response = ""
+    async for chunk in astream():
+        response += chunk
+        log(color + chunk, end="", flush=True)
+    log("\n")
+    return response
+
 
+async def ajury_verdicts(jurors, rounds, stream=False):
+    """
+    Ask every juror for its verdict on the rounds of a finished game, concurrently. A juror that fails
+    doesn't fail the game, its error is recorded instead.
 
-def run_conversation(interrogator, interrogated, num_questions):
-    print(Fore.BLUE + Style.BRIGHT + "The conversation begins!\n" + Style.RESET_ALL)
+    Returns:
+        List[Dict]: One {"juror", "verdict", "metrics"} (or {"juror", "error"}) entry per juror.
+    """
+    last_response = rounds[-1]["interrogated_response"]
+
+    async def verdict(juror):
+        juror.replay_interrogation(rounds)
+        if stream:
+            # Streaming stops the verdict as soon as the decision has been given
+            return "".join([chunk async for chunk in juror.astream_message_interrogator(last_response, "end")])
+        return await juror.asend_message_interrogator(last_response, "end")
+
+    verdicts = await asyncio.gather(*(verdict(juror) for juror in jurors), return_exceptions=True)
+    jury = []
+    for juror, result in zip(jurors, verdicts):
+        if isinstance(result, BaseException):
+            jury.append({"juror": juror.rate_key, "error": str(result)})
+        else:
+            jury.append({"juror": juror.rate_key, "verdict": result, "metrics": _metrics(juror)})
+    return jury
+
+
+async def arun_conversation(interrogator, interrogated, num_questions, verbose=True, stream=False, checkpoint=None,
+                            confidence_threshold=None, stop_after=None, jurors=()):
+    """
+    Run a single game on the running event loop, so many games can share one thread.
+    With stream, responses are rendered as they're generated and the final verdict stops generating
+    as soon as the decision has been given.
+    With a checkpoint, the game is saved after every call, and a game with a saved state continues
+    right after its last completed call.
+    With a confidence threshold, the interrogator (created with adaptive=True) is asked for its decision
+    as soon as the confidence it reports with a question reaches the threshold.
+    With stop_after, the game pauses once that many rounds have been played and the next question has been
+    asked, and returns the rounds so far. The checkpoint (e.g. a Snapshot) holds the state to continue from.
+    With jurors, every juror also gives its verdict on the transcript at the end, concurrently.
+    """
+    if num_questions < 1:
+        # The game only ends once num_questions rounds have been played
+        raise ValueError(f"A game has at least one question, not {num_questions}.")
+    if stop_after is not None and not 0 <= stop_after < num_questions:
+        raise ValueError(f"Can't pause after round {stop_after} of a {num_questions}-question game.")
+    log = print if verbose else (lambda *args, **kwargs: None)
     history = []  # Store conversation history
+    # The interrogator's last message, the metrics of its call and the confidence reported with it,
+    # until the interrogated answers it
+    question, question_metrics, confidence = None, None, None
+    if checkpoint is not None and checkpoint.state:
+        # Copied, so games forked from the same state don't add their rounds to each other's
+        history = list(checkpoint.state["history"])
+        question, question_metrics = checkpoint.state["question"], checkpoint.state["question_metrics"]
+        confidence = checkpoint.state.get("confidence")
+        interrogator.set_state(checkpoint.state["interrogator"])
+        interrogated.set_state(checkpoint.state["interrogated"])
+        log(Fore.BLUE + Style.BRIGHT + f"The conversation resumes after round {len(history)}!\n" + Style.RESET_ALL)
+    else:
+        log(Fore.BLUE + Style.BRIGHT + "The conversation begins!\n" + Style.RESET_ALL)
 
-    # Start the conversation
-    interrogator_response = interrogator.send_message_interrogator(
-        "What is your first question for the interrogated?", "start"
-    )
-    state = "middle"
+    def save():
+        if checkpoint is not None:
+            checkpoint.save({
+                "history": history,
+                "question": question,
+                "question_metrics": question_metrics,
+                "confidence": confidence,
+                "interrogator": interrogator.get_state(),
+                "interrogated": interrogated.get_state(),
+            })
 
-    for round in range(num_questions):
-        print(Fore.YELLOW + f"[Round {round + 1}]")
-        print(Fore.CYAN + f"Interrogator has asked:\n {interrogator_response}\n")
+    async def ask(state, message):
+        if state in ("end", "decide"):
+            log(Fore.MAGENTA + Style.BRIGHT + "The conversation has ended.")
+            prefix, color = "Final verdict from the interrogator: ", Fore.RED + Style.BRIGHT
+        else:
+            log(Fore.YELLOW + f"[Round {len(history) + 1}]")
+            prefix, color = "Interrogator has asked:\n ", Fore.CYAN
+        response = await _say(
+            prefix, color, log, stream,
+            lambda: interrogator.asend_message_interrogator(message, state),
+            lambda: interrogator.astream_message_interrogator(message, state),
+        )
+        return response, _metrics(interrogator)
+
+    early_verdict = None
+    while True:
+        if question is None:
+            # Start the conversation, ask the next question or, after the last round, give the verdict
+            if not history:
+                question, question_metrics = await ask("start", "What is your first question for the interrogated?")
+            else:
+                state = "end" if len(history) == num_questions else "middle"
+                question, question_metrics = await ask(state, history[-1]["interrogated_response"])
+                if confidence_threshold is not None and state == "middle":
+                    question, confidence = split_confidence(question)
+            save()
+
+        if len(history) == stop_after:
+            return history
+
+        if len(history) == num_questions:
+            verdict, verdict_metrics = question, question_metrics
+            break
+        if confidence is not None and confidence["confidence"] >= confidence_threshold:
+            # The interrogator is sure enough, its last question is never asked
+            log(Fore.BLUE + f"The interrogator is {confidence['confidence']:.0%} confident after "
+                            f"{len(history)} rounds.")
+            verdict, verdict_metrics = await ask("decide", "")
+            early_verdict = {**confidence, "question": question, "question_metrics": question_metrics}
+            break
 
         # Get response from the interrogated
-        interrogated_response = interrogated.send_message_interrogated(interrogator_response)
-        print(Fore.GREEN + f"Interrogated has responded:\n {interrogated_response}\n")
+        interrogated_response = await _say(
+            "Interrogated has responded:\n ", Fore.GREEN, log, stream,
+            lambda: interrogated.asend_message_interrogated(question),
+            lambda: interrogated.astream_message_interrogated(question),
+        )
 
         # Save the round to history
         history.append({
-            "round": round + 1,
-            "interrogator_question": interrogator_response,
-            "interrogated_response": interrogated_response
+            "round": len(history) + 1,
+            "interrogator_question": question,
+            "interrogated_response": interrogated_response,
+            "interrogator_metrics": question_metrics,
+            "interrogated_metrics": _metrics(interrogated),
         })
+        if confidence is not None:
+            history[-1]["interrogator_confidence"] = confidence
+        question, confidence = None, None
+        save()
 
-        # Determine the state and get next question from the interrogator
-        state = "end" if round == num_questions - 1 else "middle"
-        interrogator_response = interrogator.send_message_interrogator(interrogated_response, state)
-
-    print(Fore.MAGENTA + Style.BRIGHT + "The conversation has ended.")
-    print(Fore.RED + Style.BRIGHT + f"Final verdict from the interrogator: {interrogator_response}\n")
-    history.append({"final_verdict": interrogator_response})
+    rounds = len(history)
+    history.append({"final_verdict": verdict, "interrogator_metrics": verdict_metrics, "rounds": rounds})
+    if early_verdict is not None:
+        history[-1]["early_verdict"] = early_verdict
+    if jurors and rounds:
+        history[-1]["jury"] = await ajury_verdicts(jurors, history[:rounds], stream)
+        for juror in history[-1]["jury"]:
+            log(Fore.RED + f"Verdict from {juror['juror']}: {juror.get('verdict') or juror['error']}")
+        log("")
+    log_token_usage(history, log)
 
     return history
 
 
+async def afork_conversation(interrogator, interrogated, branches, num_questions, shared_rounds, verbose=True,
+                             confidence_threshold=None):
+    """
+    Play the first shared_rounds rounds (and the question after them) once, then continue that prefix with
+    every (interrogator, interrogated) pair in branches concurrently. A branch's handlers take over the
+    prefix's conversations as they are, including the prompts the prefix's interrogated was sent.
+
+    Returns:
+        List[List[Dict]]: The history of every branch, each starting with the shared rounds.
+    """
+    snapshot = Snapshot()
+    async with batch_game():
+        await arun_conversation(interrogator, interrogated, num_questions, verbose, checkpoint=snapshot,
+                                confidence_threshold=confidence_threshold, stop_after=shared_rounds)
+
+    async def branch(index, branch_interrogator, branch_interrogated):
+        # Two branches can continue the prefix with the same models, each must get its own responses from the cache
+        with cache_sample(f"branch {index}"):
+            async with batch_game():
+                return await arun_conversation(branch_interrogator, branch_interrogated, num_questions,
+                                               verbose=False, checkpoint=snapshot.fork(),
+                                               confidence_threshold=confidence_threshold)
+
+    histories = await asyncio.gather(*(branch(index, *handlers) for index, handlers in enumerate(branches)))
+    for history in histories:
+        history[-1]["forked_after"] = shared_rounds
+    return histories
+
+
+def run_conversation(interrogator, interrogated, num_questions, verbose=True, stream=False, checkpoint=None,
+                     confidence_threshold=None, jurors=()):
+    return run_sync(arun_conversation(interrogator, interrogated, num_questions, verbose, stream, checkpoint,
+                                      confidence_threshold, jurors=jurors))
+
+
 def main():
+    if sys.argv[1:2] == ["analyze"]:
+        # Imported here, games don't need NumPy
+        from analysis import main as analyze
+        analyze(sys.argv[2:])
+        return
     args = parse_args()
+    configure_run(args)
     # Parse interrogator
     interrogator_type, interrogator_key = parse_entity(args.interrogator)
     # Parse interrogated
@@ -115,47 +679,33 @@ def main():
     test_mode = args.test  # Test mode flag - use cheap models for testing
     evasion_mode = args.evasion  # Evasion mode flag - interrogated tries to evade
 
-    # Create interrogator handler
-    match interrogator_type.lower():
-        case "gemini":
-            from models.gemini import GeminiHandler
-            interrogator = GeminiHandler("interrogator", test_mode, evasion_mode, api_key=interrogator_key)
-        case "llama":
-            from models.llama import LlamaHandler
-            interrogator = LlamaHandler("interrogator", evasion_mode)
-        case "claude":
-            from models.claude import ClaudeSonnetHandler
-            interrogator = ClaudeSonnetHandler("interrogator", test_mode, evasion_mode, api_key=interrogator_key)
-        case "openai":
-            from models.openai import OpenAIGPTHandler
-            interrogator = OpenAIGPTHandler("interrogator", test_mode, evasion_mode, api_key=interrogator_key)
-        case _:
-            raise ValueError(
-                f"Unknown interrogator type: {interrogator_type}. Please use gemini/llama/claude/openai::<API_KEY>.")
-
-    match interrogated_type.lower():
-        case "gemini":
-            from models.gemini import GeminiHandler
-            interrogated = GeminiHandler("interrogated", test_mode, evasion_mode, api_key=interrogated_key)
-        case "llama":
-            from models.llama import LlamaHandler
-            interrogated = LlamaHandler("interrogated", evasion_mode)
-        case "claude":
-            from models.claude import ClaudeSonnetHandler
-            interrogated = ClaudeSonnetHandler("interrogated", test_mode, evasion_mode, api_key=interrogated_key)
-        case "openai":
-            from models.openai import OpenAIGPTHandler
-            interrogated = OpenAIGPTHandler("interrogated", test_mode, evasion_mode, api_key=interrogated_key)
-        case "human":
-            from models.llm import HumanHandler
-            interrogated = HumanHandler()
-        case _:
-            raise ValueError(
-                f"Unknown interrogated type: {interrogated_type}. Please use gemini/llama/claude/openai/human::<API_KEY>.")
+    adaptive = args.confidence_threshold is not None  # Adaptive mode - stop once the interrogator is confident
+
+    interrogator = create_handler(interrogator_type, "interrogator", test_mode, evasion_mode, interrogator_key,
+                                  args.questions, adaptive)
+    interrogated = create_handler(interrogated_type, "interrogated", test_mode, evasion_mode, interrogated_key,
+                                  args.questions, adaptive)
+    jurors = create_jurors(args.jury, test_mode, evasion_mode, args.questions)
+
+    checkpoint = None
+    if args.checkpoint_dir:
+        path = checkpoint_path(args.checkpoint_dir, interrogator_type, interrogated_type, evasion_mode)
+        checkpoint = Checkpoint(path, game_settings(args.questions, args.confidence_threshold))
+        if checkpoint.finished:
+            checkpoint.clear()
 
     # Run conversation and save history
-    history = run_conversation(interrogator, interrogated, NUMBER_OF_QUESTIONS)
-    save_conversation_log(interrogator_type, interrogated_type, history)
+    try:
+        history = run_conversation(interrogator, interrogated, args.questions, stream=args.stream,
+                                   checkpoint=checkpoint, confidence_threshold=args.confidence_threshold,
+                                   jurors=jurors)
+    finally:
+        get_recorder().close()
+    save_game(interrogator_type, interrogated_type, history, evasion_mode)
+    if checkpoint is not None:
+        checkpoint.clear()
+    if get_store():
+        get_store().close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,333 @@
+import asyncio
+import contextvars
+import datetime
+import itertools
+import json
+import os
+from contextlib import asynccontextmanager, nullcontext
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+from models.scheduler import get_scheduler, is_transient
+
+# off: every call is sent on its own. provider: calls go to the providers' batch APIs (OpenAI, Anthropic), the
+# providers without one are called directly. local: all calls go through the file-based stand-in, for tests.
+BATCH_MODES = ["off", "provider", "local"]
+DEFAULT_POLL_INTERVAL = 30.0
+# Seconds the calls made at the same time (e.g. a jury's) are given to join a batch before it's sent
+DEFAULT_SETTLE = 0.05
+OPENAI_ENDPOINT = "/v1/chat/completions"
+OPENAI_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# The game the current task plays, set by Batcher.game
+_game = contextvars.ContextVar("batch_game", default=None)
+_request_ids = itertools.count()
+_job_ids = itertools.count()
+
+
+class BatchError(Exception):
+    """A request of a batch job failed, or the whole job did."""
+
+
+@dataclass
+class BatchRequest:
+    custom_id: str
+    handler: "LLMHandler"
+    body: Dict  # The request in the provider's format, see LLMHandler._batch_body
+    game: object
+    future: asyncio.Future
+
+
+class BatchBackend:
+    """Runs one batch job: submits the requests, polls until the job is done and collects the results."""
+
+    def __init__(self, batcher: "Batcher"):
+        self.poll_interval = batcher.poll_interval
+
+    async def run(self, requests: List[BatchRequest]) -> Dict[str, Union["Completion", Exception]]:
+        """The completion, or the error, of every request by custom_id."""
+        job = await self.submit(requests)
+        while True:
+            try:
+                if await self.done(job):
+                    break
+            except Exception as e:
+                # The job keeps running on the provider's side, a failed check is worth another try
+                if not is_transient(e):
+                    raise
+            await asyncio.sleep(self.poll_interval)
+        return await self.results(job, requests)
+
+    async def submit(self, requests: List[BatchRequest]) -> str:
+        raise NotImplementedError
+
+    async def done(self, job: str) -> bool:
+        raise NotImplementedError
+
+    async def results(self, job: str, requests: List[BatchRequest]) -> Dict[str, Union["Completion", Exception]]:
+        raise NotImplementedError
+
+
+class DirectBackend(BatchBackend):
+    """For providers without a batch API: the requests are sent at once, through the scheduler as usual."""
+
+    async def run(self, requests: List[BatchRequest]) -> Dict[str, Union["Completion", Exception]]:
+        results = await asyncio.gather(*(
+            get_scheduler().acall(request.handler.rate_key, request.handler._agenerate,
+                                  request.handler._estimate_tokens())
+            for request in requests
+        ), return_exceptions=True)
+        return {request.custom_id: result for request, result in zip(requests, results)}
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    File-based stand-in for a provider's batch service, for tests and offline runs. The requests are written to
+    an input file, answered by their handlers' own providers (e.g. mock) as the service would, and the results
+    are written to an output file and ingested from there.
+    """
+
+    def __init__(self, batcher: "Batcher"):
+        super().__init__(batcher)
+        self.directory = batcher.directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, job: str, kind: str) -> str:
+        return os.path.join(self.directory, f"{job}-{kind}.jsonl")
+
+    async def submit(self, requests: List[BatchRequest]) -> str:
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        job = f"batch-{timestamp}-{os.getpid()}-{next(_job_ids):05d}"
+        with open(self._path(job, "input"), "w") as input_file:
+            for request in requests:
+                input_file.write(json.dumps({"custom_id": request.custom_id, "model": request.handler.rate_key,
+                                             "body": request.body}) + "\n")
+        # The service's work: no scheduler, a batch job isn't subject to the per-request rate limits
+        results = await asyncio.gather(*(request.handler._agenerate() for request in requests),
+                                       return_exceptions=True)
+        lines = []
+        for request, result in zip(requests, results):
+            if isinstance(result, Exception):
+                lines.append({"custom_id": request.custom_id, "error": f"{type(result).__name__}: {result}"})
+            else:
+                lines.append({"custom_id": request.custom_id, "response": {
+                    "text": result.text, "input_tokens": result.input_tokens,
+                    "output_tokens": result.output_tokens, "cached_input_tokens": result.cached_input_tokens,
+                }})
+        # Written under a temporary name first, the output file appears once it's complete
+        output = self._path(job, "output")
+        with open(output + ".tmp", "w") as output_file:
+            output_file.writelines(json.dumps(line) + "\n" for line in lines)
+        os.replace(output + ".tmp", output)
+        return job
+
+    async def done(self, job: str) -> bool:
+        return os.path.exists(self._path(job, "output"))
+
+    async def results(self, job: str, requests: List[BatchRequest]) -> Dict[str, Union["Completion", Exception]]:
+        from models.llm import Completion
+        results = {}
+        with open(self._path(job, "output")) as output_file:
+            for line in output_file:
+                result = json.loads(line)
+                if "error" in result:
+                    results[result["custom_id"]] = BatchError(result["error"])
+                else:
+                    results[result["custom_id"]] = Completion(**result["response"])
+        return results
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """OpenAI's Batch API, over HTTP: the installed SDK predates it."""
+
+    def __init__(self, batcher: "Batcher"):
+        super().__init__(batcher)
+        self.batch = None
+
+    async def _request(self, api_key: str, method: str, path: str, **kwargs):
+        import aiohttp
+        import openai
+        from models.registry import clients
+        session = clients.get_async(("openai", "aiohttp"), aiohttp.ClientSession)
+        async with session.request(method, openai.api_base + path,
+                                   headers={"Authorization": f"Bearer {api_key}"}, **kwargs) as response:
+            response.raise_for_status()
+            if response.content_type == "application/json":
+                return await response.json()
+            return await response.text()
+
+    async def submit(self, requests: List[BatchRequest]) -> str:
+        import aiohttp
+        self.api_key = requests[0].handler.api_key
+        lines = "".join(json.dumps({"custom_id": request.custom_id, "method": "POST", "url": OPENAI_ENDPOINT,
+                                    "body": request.body}) + "\n" for request in requests)
+        form = aiohttp.FormData()
+        form.add_field("purpose", "batch")
+        form.add_field("file", lines.encode(), filename="batch.jsonl", content_type="application/jsonl")
+        input_file = await self._request(self.api_key, "POST", "/files", data=form)
+        batch = await self._request(self.api_key, "POST", "/batches", json={
+            "input_file_id": input_file["id"], "endpoint": OPENAI_ENDPOINT, "completion_window": "24h",
+        })
+        return batch["id"]
+
+    async def done(self, job: str) -> bool:
+        self.batch = await self._request(self.api_key, "GET", f"/batches/{job}")
+        return self.batch["status"] in OPENAI_FINAL_STATUSES
+
+    async def results(self, job: str, requests: List[BatchRequest]) -> Dict[str, Union["Completion", Exception]]:
+        if self.batch["status"] == "failed":
+            raise BatchError(f"OpenAI batch {job} failed: {self.batch.get('errors')}")
+        handlers = {request.custom_id: request.handler for request in requests}
+        results = {}
+        # Requests that weren't answered before the batch expired are in neither file, they are reported missing
+        for file_id in (self.batch.get("output_file_id"), self.batch.get("error_file_id")):
+            if not file_id:
+                continue
+            for line in (await self._request(self.api_key, "GET", f"/files/{file_id}/content")).splitlines():
+                result = json.loads(line)
+                response = result.get("response") or {}
+                if response.get("status_code") == 200:
+                    results[result["custom_id"]] = handlers[result["custom_id"]]._completion(response["body"])
+                else:
+                    error = result.get("error") or response.get("body", {}).get("error")
+                    results[result["custom_id"]] = BatchError(f"OpenAI batch request failed: {error}")
+        return results
+
+
+class AnthropicBatchBackend(BatchBackend):
+    """Anthropic's Message Batches API."""
+
+    async def submit(self, requests: List[BatchRequest]) -> str:
+        self.client = requests[0].handler.async_client
+        batch = await self.client.messages.batches.create(requests=[
+            {"custom_id": request.custom_id, "params": request.body} for request in requests
+        ])
+        return batch.id
+
+    async def done(self, job: str) -> bool:
+        return (await self.client.messages.batches.retrieve(job)).processing_status == "ended"
+
+    async def results(self, job: str, requests: List[BatchRequest]) -> Dict[str, Union["Completion", Exception]]:
+        handlers = {request.custom_id: request.handler for request in requests}
+        results = {}
+        async for entry in await self.client.messages.batches.results(job):
+            if entry.result.type == "succeeded":
+                results[entry.custom_id] = handlers[entry.custom_id]._completion(entry.result.message)
+            else:
+                error = getattr(entry.result, "error", None)
+                results[entry.custom_id] = BatchError(f"Anthropic batch request {entry.result.type}: {error}")
+        return results
+
+
+# LLMHandler.batch_api -> the backend that runs its batch jobs
+BACKENDS = {
+    "direct": DirectBackend,
+    "local": LocalBatchBackend,
+    "openai": OpenAIBatchBackend,
+    "claude": AnthropicBatchBackend,
+}
+
+
+class Batcher:
+    """
+    Round-synchronous batching of the calls of many concurrent games. A call made in batch mode waits until
+    every running game is waiting on a call, then all of them are sent together, as one batch job per provider
+    and key, and every game advances by one call per job. Batch jobs cost less and aren't rate limited per
+    request, at the price of latency.
+    """
+
+    def __init__(self, mode: str = "provider", directory: str = "batches",
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, settle: float = DEFAULT_SETTLE):
+        if mode not in BATCH_MODES[1:]:
+            raise ValueError(f"Invalid batch mode: {mode}. Mode must be one of {BATCH_MODES[1:]}.")
+        self.mode = mode
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.settle = settle
+        self.games = set()
+        self.pending: List[BatchRequest] = []
+        self.flushing: Optional[asyncio.Task] = None
+        self.jobs = 0
+        self.requests = 0
+
+    @asynccontextmanager
+    async def game(self):
+        """Plays a game in batch mode: the batches wait for the calls of the games playing within this context."""
+        game = object()
+        self.games.add(game)
+        token = _game.set(game)
+        try:
+            yield
+        finally:
+            _game.reset(token)
+            self.games.discard(game)
+            # The others may have been waiting for this game only
+            self._check()
+
+    def _backend(self, handler) -> Tuple[str, Optional[str]]:
+        name = "local" if self.mode == "local" else getattr(handler, "batch_api", None) or "direct"
+        return name, getattr(handler, "api_key", None)
+
+    async def complete(self, handler) -> "Completion":
+        """The handler's completion of its current history, from the next batch."""
+        game = _game.get()
+        if game not in self.games:
+            # Not played as part of a batch, e.g. a handler used on its own
+            return await get_scheduler().acall(handler.rate_key, handler._agenerate, handler._estimate_tokens())
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(BatchRequest(f"request-{next(_request_ids)}", handler, handler._batch_body(), game,
+                                         future))
+        self._check()
+        return await future
+
+    def _check(self):
+        """Sends the pending calls once every running game is waiting on one."""
+        if self.flushing is None and self.pending and self.games <= {request.game for request in self.pending}:
+            self.flushing = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        try:
+            await asyncio.sleep(self.settle)
+            requests, self.pending = self.pending, []
+            groups: Dict[Tuple[str, Optional[str]], List[BatchRequest]] = {}
+            for request in requests:
+                groups.setdefault(self._backend(request.handler), []).append(request)
+            await asyncio.gather(*(self._run(name, group) for (name, _), group in groups.items()))
+        finally:
+            self.flushing = None
+            self._check()
+
+    async def _run(self, name: str, requests: List[BatchRequest]):
+        self.jobs += 1
+        self.requests += len(requests)
+        try:
+            results = await BACKENDS[name](self).run(requests)
+        except Exception as e:
+            results = {request.custom_id: BatchError(f"{name} batch job failed: {e}") for request in requests}
+        for request in requests:
+            result = results.get(request.custom_id, BatchError(f"{name} batch job returned no result"))
+            if request.future.done():
+                # The game was cancelled while the job ran
+                continue
+            if isinstance(result, BaseException):
+                request.future.set_exception(result)
+            else:
+                request.future.set_result(result)
+
+
+_batcher: Optional[Batcher] = None
+
+
+def get_batcher() -> Optional[Batcher]:
+    """The process-wide batcher, None when calls are sent one by one."""
+    return _batcher
+
+
+def set_batcher(batcher: Optional[Batcher]):
+    global _batcher
+    _batcher = batcher
+
+
+def batch_game():
+    """Batcher.game of the process-wide batcher, a no-op when calls are sent one by one."""
+    return _batcher.game() if _batcher is not None else nullcontext()
@@ -0,0 +1,141 @@
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional
+
+CACHE_MODES = ["readwrite", "replay"]
+
+_sample = contextvars.ContextVar("cache_sample", default=None)
+
+
+class CacheMiss(Exception):
+    """Raised in replay mode when a request has no cached response."""
+
+
+class CachedResponse(NamedTuple):
+    text: str
+    input_tokens: Optional[int]
+    output_tokens: Optional[int]
+
+
+class ResponseCache:
+    """
+    On-disk cache of model responses, keyed on a content hash of everything that determines a response.
+
+    Modes:
+        readwrite: serve hits, call the provider on misses and store the result.
+        replay: serve hits and raise CacheMiss on misses, never writes - for offline and deterministic re-runs.
+
+    Entries older than `ttl` seconds are ignored and dropped, and once more than `max_entries` are stored
+    the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str, mode: str = "readwrite", ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Invalid cache mode: {mode}. Mode must be one of {CACHE_MODES}.")
+        self.mode = mode
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Handlers share the cache across worker threads, the lock serializes access to the connection
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, text TEXT NOT NULL, input_tokens INTEGER, output_tokens INTEGER, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, messages: List[Dict], params: Dict) -> str:
+        """Content hash of a request, identical requests get identical keys."""
+        payload = json.dumps(
+            {"model": model, "system": system_prompt, "messages": messages, "params": params},
+            sort_keys=True, ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """
+        Looks up a cached response.
+
+        Raises:
+            CacheMiss: In replay mode, if the response isn't cached.
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT text, input_tokens, output_tokens, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl is not None and now - row[3] > self.ttl:
+                if self.mode != "replay":
+                    self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is not None and self.mode != "replay":
+                self.connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        if row is None:
+            if self.mode == "replay":
+                raise CacheMiss(f"No cached response for request {key} in replay mode.")
+            return None
+        return CachedResponse(row[0], row[1], row[2])
+
+    def put(self, key: str, text: str, input_tokens: Optional[int] = None, output_tokens: Optional[int] = None):
+        if self.mode == "replay":
+            return
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, text, input_tokens, output_tokens, now, now),
+            )
+            if self.max_entries is not None:
+                self.connection.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """The process-wide response cache, None when caching is disabled."""
+    return _cache
+
+
+def set_cache(cache: Optional[ResponseCache]):
+    global _cache
+    _cache = cache
+
+
+@contextmanager
+def cache_sample(sample: str):
+    """
+    Keys the requests made within this context apart from identical requests made under another sample,
+    so e.g. the repetitions of a tournament each get their own responses instead of all replaying the first.
+    """
+    token = _sample.set(sample)
+    try:
+        yield
+    finally:
+        _sample.reset(token)
+
+
+def get_cache_sample() -> Optional[str]:
+    """The sample of the game being played, None outside cache_sample."""
+    return _sample.get()
@@ -1,67 +1,92 @@
-from models.llm import LLMHandler, MAX_TOKENS
+from typing import AsyncIterator
+from models.llm import Completion, LLMHandler, MAX_TOKENS
+from models.prompts import NUMBER_OF_QUESTIONS
+from models.registry import clients
 import anthropic
 
 
+# Marks the end of a prompt prefix for Anthropic's prompt cache
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
 # Example of a model-specific class
 class ClaudeSonnetHandler(LLMHandler):
     """Handler for Claude Sonnet models."""
 
-    def __init__(self, role: str, test_mode: bool, evasion: bool, api_key: str):
-        super().__init__(role, evasion)
-        self.client = anthropic.Client(api_key=api_key)
+    provider = "claude"
+    batch_api = "claude"
+    context_tokens = 200000
+    prices = {"claude-3-5-sonnet-20240620": (3.00, 15.00), "claude-3-haiku-20240307": (0.25, 1.25)}
+
+    def __init__(self, role: str, test_mode: bool, evasion: bool, api_key: str,
+                 num_questions: int = NUMBER_OF_QUESTIONS, adaptive: bool = False):
+        super().__init__(role, evasion, num_questions, adaptive)
+        self.api_key = api_key
         if test_mode:
             self.model_name = "claude-3-haiku-20240307" # this is the cheap model - use for testing...
         else:
             self.model_name = "claude-3-5-sonnet-20240620"
 
-    def send_message_interrogated(self, user_message: str) -> str:
-        """
-        Sends a message to the Claude Sonnet model and returns the response.
+    @property
+    def async_client(self) -> anthropic.AsyncClient:
+        # Clients are pooled per key and event loop, so every handler shares the same connection pool
+        return clients.get_async(("claude", self.api_key), lambda: anthropic.AsyncClient(api_key=self.api_key))
 
-        Args:
-            user_message (str): The user's message.
-        Returns:
-            str: The response from the Sonnet model.
+    def _system(self) -> list:
+        return [{"type": "text", "text": self.system_prompt, "cache_control": CACHE_CONTROL}]
+
+    def _messages(self) -> list:
         """
+        The history with cache breakpoints on the last two user messages. The last one writes the whole
+        prompt to the cache for the next turn, the one before it reads the prefix written by the previous turn,
+        so every turn only pays full price for the messages added since.
+        """
+        messages = self.history.to_dicts()
+        user_indexes = [i for i, message in enumerate(messages) if message["role"] == "user"][-2:]
+        for i in user_indexes:
+            messages[i] = {
+                "role": "user",
+                "content": [{"type": "text", "text": messages[i]["content"], "cache_control": CACHE_CONTROL}],
+            }
+        return messages
+
+    def _batch_body(self) -> dict:
+        return {"model": self.model_name, "system": self._system(), "messages": self._messages(),
+                "max_tokens": MAX_TOKENS}
 
-        super().send_message_interrogated(user_message)
-        
-        try:
-            response = self.client.messages.create(
-                model=self.model_name,
-                messages=self.history,
-                system=self.system_prompt,
-                max_tokens=MAX_TOKENS
-            )
-            response = response.content[0].text
-        except Exception as e:
-            response = f"[Error: {e}]"
+    @staticmethod
+    def _completion(response) -> Completion:
+        usage = response.usage
+        cached = usage.cache_read_input_tokens or 0
+        # Anthropic's input_tokens only counts the tokens after the last cache breakpoint
+        input_tokens = usage.input_tokens + cached + (usage.cache_creation_input_tokens or 0)
+        return Completion(response.content[0].text, input_tokens, usage.output_tokens, cached)
 
-        self.history.append({"role": "assistant", "content": response})
-        return response
-    
-    def send_message_interrogator(self, user_message: str, state: str) -> str:
+    async def _agenerate(self) -> Completion:
         """
-        Sends a message to the Claude Sonnet model and returns the response.
+        Sends the history to the Claude Sonnet model with the async client and returns the response.
 
-        Args:
-            user_message (str): The user's message.
         Returns:
-            str: The response from the Sonnet model.
+            Completion: The response from the Sonnet model.
         """
+        response = await self.async_client.messages.create(
+            model=self.model_name,
+            messages=self._messages(),
+            system=self._system(),
+            max_tokens=MAX_TOKENS
+        )
+        return self._completion(response)
 
-        super().send_message_interrogator(user_message, state)
-
-        try:
-            response = self.client.messages.create(
-                model=self.model_name,
-                messages=self.history,
-                system=self.system_prompt,
-                max_tokens=MAX_TOKENS
-            )
-            response = response.content[0].text
-        except Exception as e:
-            response = f"[Error: {e}]"
-
-        self.history.append({"role": "assistant", "content": response})
-        return response
\ No newline at end of file
+    async def _astream(self) -> AsyncIterator[str]:
+        """
+        Streams the response of the Claude Sonnet model to the history with the async client.
+        Leaving the stream's context closes the connection, which stops the generation.
+        """
+        async with self.async_client.messages.stream(
+            model=self.model_name,
+            messages=self._messages(),
+            system=self._system(),
+            max_tokens=MAX_TOKENS
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
@@ -0,0 +1,58 @@
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+
+class Message(NamedTuple):
+    """One message, with a provider-neutral role: "user" or "assistant"."""
+    role: str
+    content: str
+
+
+class Conversation:
+    """
+    An immutable conversation, stored as a chain of messages: appending returns a new conversation
+    that points back to this one, so conversations that branch off each other share their common prefix,
+    and keeping a snapshot (to roll back a failed call, or to fork a game) is O(1).
+
+    Providers render it to their wire format when they send it, see LLMHandler._messages.
+    """
+
+    __slots__ = ("parent", "message", "length", "chars")
+
+    def __init__(self, parent: Optional["Conversation"] = None, message: Optional[Message] = None):
+        self.parent = parent
+        self.message = message
+        self.length = parent.length + 1 if parent is not None else 0
+        # Total characters of all messages, so budgeting a request doesn't walk the conversation
+        self.chars = (parent.chars if parent is not None else 0) + (len(message.content) if message else 0)
+
+    def append(self, role: str, content: str) -> "Conversation":
+        return Conversation(self, Message(role, content))
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[Message]:
+        messages = []
+        node = self
+        while node.message is not None:
+            messages.append(node.message)
+            node = node.parent
+        return reversed(messages)
+
+    @property
+    def last(self) -> Optional[Message]:
+        return self.message
+
+    def count(self, role: str) -> int:
+        return sum(message.role == role for message in self)
+
+    def to_dicts(self) -> List[Dict]:
+        """The messages as {"role", "content"} dicts - JSON-serializable, and the wire format of most providers."""
+        return [{"role": message.role, "content": message.content} for message in self]
+
+    @classmethod
+    def from_dicts(cls, messages: List[Dict]) -> "Conversation":
+        conversation = cls()
+        for message in messages:
+            conversation = conversation.append(message["role"], message["content"])
+        return conversation
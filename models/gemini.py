@@ -1,79 +1,67 @@
-from models.llm import LLMHandler
+import os
+from typing import AsyncIterator
+from models.llm import Completion, LLMHandler
+from models.prompts import NUMBER_OF_QUESTIONS
+from models.registry import clients
+import google.ai.generativelanguage as glm
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 
+SAFETY_SETTINGS = {
+    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE
+}
+
 
 # Example of a model-specific class
 class GeminiHandler(LLMHandler):
     """Handler for Gemini models."""
 
-    def __init__(self, role: str, test_mode: bool, evasion: bool, api_key: str):
-        super().__init__(role, evasion)
-        genai.configure(api_key=api_key)
-        if test_mode:
-            self.model = genai.GenerativeModel("gemini-1.5-flash", system_instruction=self.system_prompt) # this is the cheap model - use for testing...
-        else:
-            self.model = genai.GenerativeModel("gemini-1.5-pro", system_instruction=self.system_prompt)
-        
-        self.chat = self.model.start_chat()
+    provider = "gemini"
+    context_tokens = 1000000  # Gemini 1.5 Flash, Pro has twice as many
+    prices = {"gemini-1.5-pro": (1.25, 5.00), "gemini-1.5-flash": (0.075, 0.30)}  # Prompts up to 128k tokens
 
-    def send_message_interrogated(self, user_message: str) -> str:
-        """
-        Sends a message to the Google's Gemini model and returns the response.
+    def __init__(self, role: str, test_mode: bool, evasion: bool, api_key: str,
+                 num_questions: int = NUMBER_OF_QUESTIONS, adaptive: bool = False):
+        super().__init__(role, evasion, num_questions, adaptive)
+        # genai.configure is global, so the key goes into a pooled per-key client instead
+        self.api_key = api_key or os.environ.get("GOOGLE_API_KEY")
+        self.model_name = "gemini-1.5-flash" if test_mode else "gemini-1.5-pro" # flash is the cheap model - use for testing...
+        self.model = genai.GenerativeModel(self.model_name, system_instruction=self.system_prompt)
 
-        Args:
-            user_message (str): The user's message.
-        Returns:
-            str: The response from the Gemini model.
-        """
+    def _contents(self) -> list:
+        # The whole conversation is sent from self.history rather than a stateful ChatSession,
+        # so responses served from the cache can't leave the SDK's copy of the chat behind
+        return [{"role": "model" if message.role == "assistant" else "user", "parts": [message.content]}
+                for message in self.history]
 
-        super().send_message_interrogated(user_message)
-        message = self.history[-1]
-        message = {"role": message["role"], "parts": message["content"]}
-        
-        try:
-            response = self.chat.send_message(
-                message,
-                safety_settings={
-                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE
-                }
-            )
-            response = response.text
-        except Exception as e:
-            response = f"[Error: {e}]"
+    def _use_async_client(self):
+        # Async clients are bound to the running event loop, so they are looked up on every call
+        self.model._async_client = clients.get_async(
+            ("gemini", self.api_key), lambda: glm.GenerativeServiceAsyncClient(client_options={"api_key": self.api_key}))
 
-        self.history.append({"role": "model", "content": response})
-        return response
+    @staticmethod
+    def _completion(response) -> Completion:
+        usage = response.usage_metadata
+        return Completion(response.text, usage.prompt_token_count, usage.candidates_token_count,
+                          usage.cached_content_token_count)
 
-    def send_message_interrogator(self, user_message: str, state: str) -> str:
+    async def _agenerate(self) -> Completion:
         """
-        Sends a message to the Google's Gemini model and returns the response.
+        Sends the history to the Google's Gemini model with the async API and returns the response.
 
-        Args:
-            user_message (str): The user's message.
         Returns:
-            str: The response from the Gemini model.
+            Completion: The response from the Gemini model.
         """
+        self._use_async_client()
+        response = await self.model.generate_content_async(self._contents(), safety_settings=SAFETY_SETTINGS)
+        return self._completion(response)
 
-        super().send_message_interrogator(user_message, state)
-        message = self.history[-1]
-        message = {"role": message["role"], "parts": message["content"]}
-        try:
-            response = self.chat.send_message(
-                message,
-                safety_settings={
-                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE
-                }
-            )
-            response = response.text
-        except Exception as e:
-            response = f"[Error: {e}]"
-
-        self.history.append({"role": "model", "content": response})
-        return response
\ No newline at end of file
+    async def _astream(self) -> AsyncIterator[str]:
+        """Streams the response of the Google's Gemini model to the history with the async API."""
+        self._use_async_client()
+        chunks = await self.model.generate_content_async(self._contents(), safety_settings=SAFETY_SETTINGS, stream=True)
+        async for chunk in chunks:
+            yield chunk.text
@@ -1,51 +1,176 @@
-from models.llm import LLMHandler, MAX_TOKENS
-from transformers import pipeline
+import asyncio
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 
+from models.llm import Completion, LLMHandler, MAX_TOKENS
+from models.prompts import NUMBER_OF_QUESTIONS
+from models.registry import clients
 
-# Example of a model-specific class
-class LlamaHandler(LLMHandler):
-    """Handler for OpenAI GPT models."""
+DEFAULT_MODEL = "meta-llama/Llama-3.1-8B-Instruct"
+# A small instruct model for CPU-only boxes, it exercises the same batching path as the real model
+CPU_STAND_IN_MODEL = "HuggingFaceTB/SmolLM2-135M-Instruct"
 
-    def __init__(self, role: str, evasion: bool):
-        super().__init__(role, evasion)
-        self.pipe = pipeline("text-generation", "meta-llama/Llama-3.1-8B-Instruct", device=0)
-        self.history = [{"role": "system", "content": self.system_prompt}]
 
+@dataclass
+class LlamaSettings:
+    """Process-wide settings of the local model service, set from the command line."""
+    model_name: str = DEFAULT_MODEL
+    device: Optional[str] = None  # None picks the first GPU if there is one, and the CPU otherwise
+    max_batch_size: int = 8
+    max_wait: float = 0.05  # Seconds to wait for more requests before running a partial batch
+    # Keep each conversation's KV cache between turns, so only the new messages are encoded. Cached requests
+    # are generated one at a time, so this pays off with few concurrent conversations (e.g. human games),
+    # while batching pays off with many.
+    prefix_cache: bool = False
+    max_cached_sessions: int = 32
 
-    def send_message_interrogator(self, user_message: str, state: str) -> str:
-        """
-        Sends a message to the Meta's Llama model and returns the response.
 
-        Args:
-            user_message (str): The user's message.
-        Returns:
-            str: The response from the Llama model.
+settings = LlamaSettings()
+
+
+def configure_llama(**kwargs):
+    for name, value in kwargs.items():
+        if value is not None:
+            setattr(settings, name, value)
+
+
+class LlamaBatchService:
+    """
+    One text-generation pipeline shared by every Llama conversation in the process.
+    Pending requests are collected from all conversations and run through the model as left-padded batches.
+    """
+
+    def __init__(self, model_name: str, device: Optional[str], max_batch_size: int, max_wait: float,
+                 prefix_cache: bool = False, max_cached_sessions: int = 32):
+        import torch
+        from transformers import pipeline
+
+        if device is None:
+            device = "cuda:0" if torch.cuda.is_available() else "cpu"
+        self.pipe = pipeline("text-generation", model_name, device=device)
+        tokenizer = self.pipe.tokenizer
+        # Decoder-only models must be padded on the left so every prompt ends right where generation starts
+        tokenizer.padding_side = "left"
+        if tokenizer.pad_token_id is None:
+            tokenizer.pad_token = tokenizer.eos_token
+            self.pipe.model.generation_config.pad_token_id = tokenizer.eos_token_id
+        self.max_batch_size = 1 if prefix_cache else max_batch_size
+        self.max_wait = max_wait
+        self.prefix_cache = prefix_cache
+        self.max_cached_sessions = max_cached_sessions
+        # Session -> (token ids covered by the cache, KV cache), least recently used first
+        self.sessions = OrderedDict()
+        self.requests = queue.Queue()
+        self.worker = threading.Thread(target=self._run, name=f"llama-batcher-{model_name}", daemon=True)
+        self.worker.start()
+
+    def submit(self, history: List[Dict], session: Optional[str] = None) -> Future:
+        """
+        Queues a chat for generation, the future resolves to the model's Completion.
+        Requests of the same session reuse its KV cache when prefix caching is on.
         """
-        super().send_message_interrogator(user_message, state)
+        future = Future()
+        self.requests.put((history, session, future))
+        return future
 
-        try:
-            response = self.pipe(self.history, max_new_tokens=MAX_TOKENS)[0]['generated_text'][-1]
-        except Exception as e:
-            response = f"[Error: {e}]"
+    def _next_batch(self) -> List[Tuple[List[Dict], Optional[str], Future]]:
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
 
-        self.history.append({"role": "assistant", "content": response})
-        return response
+    def _generate_cached(self, history: List[Dict], session: str) -> Completion:
+        """Generates a reply reusing the session's KV cache for the prefix it shares with the previous turn."""
+        from transformers import DynamicCache
 
-    def send_message_interrogated(self, user_message: str) -> str:
+        tokenizer, model = self.pipe.tokenizer, self.pipe.model
+        input_ids = tokenizer.apply_chat_template(history, add_generation_prompt=True, return_tensors="pt").to(model.device)
+        cache, reused = DynamicCache(), 0
+        if session in self.sessions:
+            cached_ids, previous = self.sessions.pop(session)
+            length = min(previous.get_seq_length(), input_ids.shape[1] - 1)
+            matches = (cached_ids[:length] == input_ids[0, :length]).int()
+            # Length of the common prefix - the position of the first mismatch, if any
+            reused = int(matches.cumprod(0).sum())
+            if reused:
+                previous.crop(reused)
+                cache = previous
+        output = model.generate(
+            input_ids,
+            attention_mask=input_ids.new_ones(input_ids.shape),
+            past_key_values=cache,
+            max_new_tokens=MAX_TOKENS,
+            pad_token_id=tokenizer.pad_token_id,
+        )[0]
+        self.sessions[session] = (output, cache)
+        while len(self.sessions) > self.max_cached_sessions:
+            self.sessions.popitem(last=False)
+        new_tokens = output[input_ids.shape[1]:]
+        return Completion(tokenizer.decode(new_tokens, skip_special_tokens=True).strip(),
+                          input_ids.shape[1], len(new_tokens), reused)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if self.prefix_cache and batch[0][1] is not None:
+                history, session, future = batch[0]
+                try:
+                    future.set_result(self._generate_cached(history, session))
+                except Exception as e:
+                    future.set_exception(e)
+                continue
+            try:
+                outputs = self.pipe([history for history, _, _ in batch], max_new_tokens=MAX_TOKENS,
+                                    batch_size=len(batch))
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, _, future), output in zip(batch, outputs):
+                # The pipeline returns the whole chat, the last message is the model's reply
+                future.set_result(Completion(output[0]["generated_text"][-1]["content"]))
+
+
+def get_service(model_name: str, device: Optional[str]) -> LlamaBatchService:
+    """Returns the shared service for a model, loading the model the first time it's asked for."""
+    return clients.get(
+        ("llama", model_name, device),
+        lambda: LlamaBatchService(model_name, device, settings.max_batch_size, settings.max_wait,
+                                  settings.prefix_cache, settings.max_cached_sessions),
+    )
+
+
+# Example of a model-specific class
+class LlamaHandler(LLMHandler):
+    """Handler for Meta's Llama models."""
+
+    provider = "llama"
+
+    def __init__(self, role: str, evasion: bool, num_questions: int = NUMBER_OF_QUESTIONS, adaptive: bool = False):
+        super().__init__(role, evasion, num_questions, adaptive)
+        self.model_name = settings.model_name
+        self.service = get_service(settings.model_name, settings.device)
+        self.session = uuid.uuid4().hex
+
+    async def _agenerate(self) -> Completion:
         """
-        Sends a message to the Meta's Llama model and returns the response.
+        Sends the history to the Meta's Llama model without blocking the event loop, so concurrent
+        conversations end up in the same batch.
 
-        Args:
-            user_message (str): The user's message.
         Returns:
-            str: The response from the Llama model.
+            Completion: The response from the Llama model.
         """
-        super().send_message_interrogated(user_message)
-
-        try:
-            response = self.pipe(self.history, max_new_tokens=MAX_TOKENS)[0]['generated_text'][-1]
-        except Exception as e:
-            response = f"[Error: {e}]"
-
-        self.history.append({"role": "assistant", "content": response})
-        return response
\ No newline at end of file
+        return await asyncio.wrap_future(self.service.submit(self._messages(), self.session))
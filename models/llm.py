@@ -1,27 +1,189 @@
 import abc
-from typing import List, Dict, Union
-from models.prompts import (
-    INTERROGATOR_SYSTEM_PROMPT,
-    INTERROGATOR_START_USER_PROMPT,
-    INTERROGATOR_MIDDLE_USER_PROMPT,
-    INTERROGATOR_END_USER_PROMPT,
-    INTERROGATED_SYSTEM_PROMPT,
-    INTERROGATED_USER_PROMPT,
-    INTERROGATED_EVASION_SYSTEM_PROMPT,
-    INTERROGATED_EVASION_USER_PROMPT,
-)
+import asyncio
+import functools
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List, Dict, Optional, Tuple, TypeVar, Union
+from models.prompts import NUMBER_OF_QUESTIONS, get_prompt_set
+from models.batch import get_batcher
+from models.cache import get_cache, get_cache_sample
+from models.conversation import Conversation
+from models.metrics import CallMetrics, get_recorder
+from models.scheduler import get_scheduler
 
 MAX_TOKENS = 512
+# Rough characters-per-token ratio, used to budget a request before the provider reports its usage
+CHARS_PER_TOKEN = 4
+# The decisions the interrogator is asked to give in INTERROGATOR_END_USER_PROMPT. Only a decision that starts
+# a line (or follows a colon, as in "Decision: This is an AI.") counts, and not when it restates the two options
+VERDICT_PATTERN = re.compile(r"(?:^|:)[^\w\n]*This is (a human|an AI)\.[\"'*)]*(?![^\w\n]*(?:or|and)\b)",
+                             re.IGNORECASE | re.MULTILINE)
+# Where a sentence can end: a full stop, question or exclamation mark before whitespace, or the end of a line
+SENTENCE_END_PATTERN = re.compile(r"[.!?][\"')*]*(?=\s)|\n")
+# Full stops that don't end a sentence
+ABBREVIATIONS = ("e.g.", "i.e.", "etc.", "vs.", "cf.", "approx.")
+# The confidence line of INTERROGATOR_CONFIDENCE_SYSTEM_PROMPT, e.g. "Confidence: AI 70%". Models don't always keep
+# to the format, so this is any line or clause that starts with "Confidence" and ends the message or has a number
+CONFIDENCE_PATTERN = re.compile(r"(?:^|(?<=[.?!]))[^\w\n]*Confidence\b(?:[^\n]*\s*\Z|[^\n]*\d[^\n]*$)",
+                                re.IGNORECASE | re.MULTILINE)
+CONFIDENCE_LABEL_PATTERN = re.compile(r"\b(human|AI)\b", re.IGNORECASE)
+CONFIDENCE_VALUE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(%?)")
+# Interrogator states that ask for the final decision
+VERDICT_STATES = ("end", "decide")
+
+T = TypeVar("T")
+
+
+def justification_end(response: str, start: int) -> Optional[int]:
+    """
+    Where the sentence that starts at `start` ends, None if it hasn't ended yet. A sentence needs some words,
+    and neither an abbreviation nor a heading line like "Here is why:" ends it.
+    """
+    for end in SENTENCE_END_PATTERN.finditer(response, start):
+        sentence = response[start:end.start() if end.group() == "\n" else end.end()].strip()
+        if not re.search(r"[^\W\d_]{2,}", sentence):
+            continue
+        if end.group() == "\n" and sentence.rstrip("*\"' ").endswith(":"):
+            continue
+        if sentence.lower().endswith(ABBREVIATIONS):
+            continue
+        return end.start() if end.group() == "\n" else end.end()
+    return None
+
+
+def cut_at_verdict(text: str, chunk: str) -> Tuple[str, bool]:
+    """
+    Cuts a streamed chunk right after the verdict and the sentence that justifies it, if they are completed by it.
+
+    Args:
+        text (str): The response streamed so far.
+        chunk (str): The next chunk of the response.
+    Returns:
+        Tuple[str, bool]: The part of the chunk to keep, and whether the verdict has been given.
+    """
+    response = text + chunk
+    verdict = VERDICT_PATTERN.search(response)
+    if verdict is None:
+        return chunk, False
+    end = justification_end(response, verdict.end())
+    if end is None:
+        return chunk, False
+    return chunk[:end - len(text)], True
+
+
+def split_confidence(text: str) -> Tuple[str, Optional[Dict]]:
+    """
+    Splits the confidence line off an interrogator's message. The line is removed even when it can't be parsed,
+    the entity must never see it.
+
+    Returns:
+        Tuple[str, Optional[Dict]]: The message without the line, and {"label": "human"/"ai", "confidence": 0-1},
+        or None if the message has no confidence line or it has no label and number.
+    """
+    matches = list(CONFIDENCE_PATTERN.finditer(text))
+    if not matches:
+        return text, None
+    message = text
+    for match in reversed(matches):
+        message = message[:match.start()] + message[match.end():]
+    message = message.strip()
+    line = matches[-1].group()
+    label, value = CONFIDENCE_LABEL_PATTERN.search(line), CONFIDENCE_VALUE_PATTERN.search(line)
+    if label is None or value is None:
+        return message, None
+    confidence = float(value.group(1))
+    if value.group(2) or confidence > 1:
+        confidence /= 100
+    return message, {"label": label.group(1).lower(), "confidence": min(confidence, 1.0)}
+
+
+def run_sync(coroutine: Awaitable[T]) -> T:
+    """
+    Runs a coroutine from synchronous code on an event loop of its own. The pooled async clients are bound to
+    that loop, so they are closed before it is.
+    """
+    # Imported here, the registry imports this module
+    from models.registry import clients
+
+    async def run():
+        try:
+            return await coroutine
+        finally:
+            await clients.aclose()
+
+    return asyncio.run(run())
+
+
+def iterate_sync(chunks: AsyncIterator[T]) -> Iterator[T]:
+    """Iterates an async generator from synchronous code, on an event loop of its own like run_sync."""
+    from models.registry import clients
+
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(chunks.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        # Closing the iterator early closes the generator, which stops the generation
+        loop.run_until_complete(chunks.aclose())
+        loop.run_until_complete(clients.aclose())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+@functools.lru_cache(maxsize=None)
+def count_tokens(text: str, provider: str, model: str) -> int:
+    """
+    Tokens of a text for a model: counted with tiktoken for OpenAI models when it's installed, estimated from
+    the length otherwise. Cached, prompts are only tokenized once per model.
+    """
+    if provider == "openai":
+        try:
+            import tiktoken
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                # Models newer than the installed tiktoken, the closest encoding it has
+                encoding = tiktoken.get_encoding("cl100k_base")
+            return len(encoding.encode(text))
+        except Exception:
+            # Not installed, or its encodings can't be downloaded
+            pass
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+@dataclass
+class Completion:
+    """A model response along with the token usage the provider reported for it."""
+    text: str
+    input_tokens: Optional[int] = None  # All the prompt tokens, including the ones read from the prompt cache
+    output_tokens: Optional[int] = None
+    cached_input_tokens: Optional[int] = None  # Prompt tokens served from the provider's prefix cache
+
+    @property
+    def fresh_input_tokens(self) -> Optional[int]:
+        if self.input_tokens is None:
+            return None
+        return self.input_tokens - (self.cached_input_tokens or 0)
+
+    @property
+    def total_tokens(self) -> Optional[int]:
+        if self.input_tokens is None or self.output_tokens is None:
+            return None
+        return self.input_tokens + self.output_tokens
 
 
 class ConversationHandler(abc.ABC):
     """Abstract base class for handling conversations."""
 
     def __init__(self):
-        self.history = []
+        self.history = Conversation()
 
     @abc.abstractmethod
-    def send_message_interrogated(self, user_message: str) -> str:
+    async def asend_message_interrogated(self, user_message: str) -> str:
         """
         Sends a message to the LLM or Human and returns the response.
 
@@ -32,45 +194,406 @@ class ConversationHandler(abc.ABC):
         """
         pass
 
+    def send_message_interrogated(self, user_message: str) -> str:
+        """Blocking wrapper of asend_message_interrogated, for callers without an event loop."""
+        return run_sync(self.asend_message_interrogated(user_message))
+
+    async def astream_message_interrogated(self, user_message: str) -> AsyncIterator[str]:
+        """
+        Streaming counterpart of asend_message_interrogated, yields the response in chunks.
+        Handlers that can't stream yield the whole response at once.
+        """
+        yield await self.asend_message_interrogated(user_message)
+
+    def get_state(self) -> Dict:
+        """
+        The conversation state of the handler, to resume or fork the game from. The conversation is
+        immutable, so the state shares it rather than copying it.
+        """
+        return {"history": self.history}
+
+    def set_state(self, state: Dict):
+        """Restores a state returned by get_state, or one loaded from a checkpoint file."""
+        history = state["history"]
+        self.history = history if isinstance(history, Conversation) else Conversation.from_dicts(history)
+
 
 class LLMHandler(ConversationHandler):
     """Generic handler for LLMs."""
 
-    def __init__(self, role: str, evasion: bool):
+    def __init__(self, role: str, evasion: bool, num_questions: int = NUMBER_OF_QUESTIONS, adaptive: bool = False):
         super().__init__()
         if role not in ['interrogated', 'interrogator']:
             raise ValueError("Invalid role. Role must be 'llm' or 'human'.")
         self.role = role
+        # Latency, tokens and retries of the last call
+        self.last_metrics: Optional[CallMetrics] = None
+        prompts = get_prompt_set()
         if self.role == 'interrogator':
-            self.system_prompt = INTERROGATOR_SYSTEM_PROMPT
-            self.start_user_prompt = INTERROGATOR_START_USER_PROMPT
-            self.middle_user_prompt = INTERROGATOR_MIDDLE_USER_PROMPT
-            self.end_user_prompt = INTERROGATOR_END_USER_PROMPT
-        elif self.role == 'interrogated' and evasion:
-            self.system_prompt = INTERROGATED_EVASION_SYSTEM_PROMPT
-            self.user_prompt = INTERROGATED_EVASION_USER_PROMPT
+            self.system_prompt = prompts.interrogator_system_prompt(num_questions, adaptive)
+            templates = prompts.sections["interrogator"]
+            self.start_user_prompt = templates["start"]
+            self.middle_user_prompt = templates["middle"]
+            self.end_user_prompt = templates["end"]
+            self.decide_user_prompt = templates["decide"]
         else:
-            self.system_prompt = INTERROGATED_SYSTEM_PROMPT
-            self.user_prompt = INTERROGATED_USER_PROMPT
+            templates = prompts.interrogated(evasion)
+            self.system_prompt = templates["system"].format(number_of_questions=str(num_questions))
+            self.user_prompt = templates["user"]
+        # The prompts a game sends besides the system prompt, to budget the game before it starts
+        self.user_prompts = [template for key, template in templates.items()
+                             if key not in ("system", "confidence_system")]
 
-    def send_message_interrogator(self, user_message: str, state: str) -> str:
+    # Provider name, used with the model name as the scheduler key
+    provider = "llm"
+    model_name = ""
+    # Batch API of the provider (a key of models.batch.BACKENDS), None if it has none
+    batch_api: Optional[str] = None
+    # Context window of the model in tokens, None if it isn't known
+    context_tokens: Optional[int] = None
+    # USD per million input and output tokens, by model name. Models without prices are never refused for cost
+    prices: Dict[str, Tuple[float, float]] = {}
+
+    @property
+    def rate_key(self) -> str:
+        return f"{self.provider}/{self.model_name}"
+
+    def _add_interrogator_message(self, user_message: str, state: str):
         if state == "start":
-            self.history.append({"role": "user", "content": self.start_user_prompt})
+            self.history = self.history.append("user", self.start_user_prompt.format())
         elif state == "middle":
-            self.history.append(
-                {"role": "user", "content": self.middle_user_prompt.replace("<RESPONSE>", user_message)})
+            self.history = self.history.append("user", self.middle_user_prompt.format(response=user_message))
+        elif state == "decide":
+            self.history = self.history.append("user", self.decide_user_prompt.format())
         else:
-            self.history.append({"role": "user", "content": self.end_user_prompt.replace("<RESPONSE>", user_message)})
-        return ""
+            self.history = self.history.append("user", self.end_user_prompt.format(response=user_message))
 
-    def send_message_interrogated(self, user_message: str) -> str:
-        self.history.append({"role": "user", "content": self.user_prompt.replace("<QUESTION>", user_message)})
-        return ""
+    def _add_interrogated_message(self, user_message: str):
+        self.history = self.history.append("user", self.user_prompt.format(question=user_message))
+
+    def _add_response(self, response: str) -> str:
+        self.history = self.history.append("assistant", response)
+        return response
+
+    def replay_interrogation(self, rounds: List[Dict]):
+        """
+        Takes over the interrogator's side of a game played by another interrogator, as if this handler had
+        asked the questions, so it can give its own verdict on the transcript with the "end" state.
+
+        Args:
+            rounds (List[Dict]): The rounds of the game, with interrogator_question and interrogated_response.
+        """
+        self.history = Conversation()
+        previous_response = ""
+        for index, entry in enumerate(rounds):
+            self._add_interrogator_message(previous_response, "start" if index == 0 else "middle")
+            self._add_response(entry["interrogator_question"])
+            previous_response = entry["interrogated_response"]
+
+    def _messages(self) -> List[Dict]:
+        """The history in the provider's wire format. The default is the system prompt followed by the messages."""
+        return [{"role": "system", "content": self.system_prompt}] + self.history.to_dicts()
+
+    def _batch_body(self) -> Dict:
+        """The request for the current history in the provider's batch format, see models/batch.py."""
+        return {"model": self.model_name, "messages": self._messages(), "max_tokens": MAX_TOKENS}
+
+    @property
+    def system_tokens(self) -> int:
+        """Tokens of the system prompt for this model, counted once per prompt and model."""
+        return count_tokens(self.system_prompt, self.provider, self.model_name)
+
+    def _estimate_tokens(self) -> int:
+        """Upper bound of the tokens the next request will use, for the scheduler's budgets."""
+        return self.system_tokens + self.history.chars // CHARS_PER_TOKEN + MAX_TOKENS
+
+    def _max_prompt_tokens(self, calls: int) -> int:
+        """
+        Upper bound of the prompt of a game's `calls`-th request, with every message (the interrogated's answers
+        included, in the prompts that quote them) as long as a response can be.
+        """
+        prompt_tokens = max(count_tokens(template.text, self.provider, self.model_name)
+                            for template in self.user_prompts)
+        return self.system_tokens + calls * (prompt_tokens + 2 * MAX_TOKENS)
+
+    def max_game_tokens(self, num_questions: int) -> int:
+        """Upper bound of the prompt of the last request of a game."""
+        return self._max_prompt_tokens(num_questions + 1)
+
+    def max_game_cost(self, num_questions: int) -> Optional[float]:
+        """
+        Upper bound of what the handler's requests in a game cost in USD, every prompt as long as it can be and
+        every response MAX_TOKENS long. None if the model's prices aren't known.
+        """
+        price = self.prices.get(self.model_name)
+        if price is None:
+            return None
+        calls = num_questions + 1
+        input_tokens = sum(self._max_prompt_tokens(call) for call in range(1, calls + 1))
+        return (input_tokens * price[0] + calls * MAX_TOKENS * price[1]) / 1_000_000
+
+    def check_context(self, num_questions: int):
+        """
+        Raises:
+            ValueError: If a game of num_questions questions can outgrow the model's context window.
+        """
+        if self.context_tokens is None:
+            return
+        needed = self.max_game_tokens(num_questions)
+        if needed > self.context_tokens:
+            raise ValueError(f"A {num_questions}-question game with the {get_prompt_set().name} prompt set can "
+                             f"need {needed} tokens, more than the {self.context_tokens}-token context of "
+                             f"{self.rate_key}. Please use fewer questions or shorter prompts.")
+
+    def check_cost(self, num_questions: int):
+        """
+        Raises:
+            ValueError: If the handler's requests in a game of num_questions questions can cost more than the
+                run's limit, see set_max_game_cost.
+        """
+        limit = get_max_game_cost()
+        cost = self.max_game_cost(num_questions)
+        if limit is None or cost is None:
+            return
+        if cost > limit:
+            raise ValueError(f"A {num_questions}-question game with the {get_prompt_set().name} prompt set can cost "
+                             f"up to ${cost:.2f} in {self.rate_key} calls, more than the ${limit:.2f} limit. "
+                             f"Please use fewer questions, a cheaper model or a higher --max-game-cost.")
+
+    async def _agenerate(self) -> Completion:
+        """
+        Sends the current history to the model and returns its response.
+
+        Returns:
+            Completion: The response from the model.
+        """
+        raise NotImplementedError
+
+    async def _astream(self) -> AsyncIterator[str]:
+        """
+        Sends the current history to the model and yields its response in chunks.
+        Closing the iterator early should stop the generation.
+        Providers without streaming yield the whole response at once.
+        """
+        yield (await self._agenerate()).text
+
+    def _cache_key(self, stop_at_verdict: bool = False) -> str:
+        params = {"max_tokens": MAX_TOKENS}
+        if stop_at_verdict:
+            # Responses cut at the verdict must not be served to requests that want the full response
+            params["stop"] = "verdict and justification sentence"
+        sample = get_cache_sample()
+        if sample is not None:
+            params["sample"] = sample
+        return get_cache().make_key(self.rate_key, self.system_prompt, self.history.to_dicts(), params)
+
+    def _cached_completion(self, stop_at_verdict: bool = False) -> Optional[Completion]:
+        cache = get_cache()
+        if cache is None:
+            return None
+        hit = cache.get(self._cache_key(stop_at_verdict))
+        # A cached response costs nothing, so it doesn't report any usage
+        return Completion(hit.text) if hit else None
+
+    def _cache_completion(self, completion: Completion, stop_at_verdict: bool = False):
+        cache = get_cache()
+        if cache is not None:
+            cache.put(self._cache_key(stop_at_verdict), completion.text,
+                      completion.input_tokens, completion.output_tokens)
+
+    @contextmanager
+    def _measure(self) -> Iterator[CallMetrics]:
+        """Times a call and reports its metrics once it's done, whether it succeeded or not."""
+        metrics = CallMetrics(self.provider, self.model_name, self.role)
+        try:
+            yield metrics
+        except BaseException as e:
+            metrics.error = type(getattr(e, "cause", e)).__name__
+            raise
+        finally:
+            metrics.finish()
+            self.last_metrics = metrics
+            get_recorder().record(metrics)
+
+    async def _acomplete(self, previous: Conversation) -> str:
+        with self._measure() as metrics:
+            try:
+                completion = self._cached_completion()
+                metrics.cache_hit = completion is not None
+                if completion is None:
+                    batcher = get_batcher()
+                    if batcher is not None:
+                        completion = await batcher.complete(self)
+                    else:
+                        completion = await get_scheduler().acall(self.rate_key, self._agenerate,
+                                                                 self._estimate_tokens(), on_retry=metrics.count_retry)
+                    self._cache_completion(completion)
+            except BaseException:
+                # Drop the unanswered message so the history stays consistent if the caller retries or is cancelled
+                self.history = previous
+                raise
+            metrics.set_usage(completion)
+        return self._add_response(completion.text)
+
+    async def _astream_response(self, previous: Conversation, stop_at_verdict: bool) -> AsyncIterator[str]:
+        text = ""
+        with self._measure() as metrics:
+            try:
+                completion = self._cached_completion(stop_at_verdict)
+                metrics.cache_hit = completion is not None
+                if completion is not None:
+                    text = completion.text
+                    yield text
+                else:
+                    chunks = get_scheduler().astream(self.rate_key, self._astream, self._estimate_tokens(),
+                                                     on_retry=metrics.count_retry)
+                    try:
+                        async for chunk in chunks:
+                            metrics.first_token()
+                            chunk, verdict_given = cut_at_verdict(text, chunk) if stop_at_verdict else (chunk, False)
+                            text += chunk
+                            yield chunk
+                            if verdict_given:
+                                break
+                    finally:
+                        await chunks.aclose()
+                    self._cache_completion(Completion(text), stop_at_verdict)
+            except BaseException:
+                self.history = previous
+                raise
+        self._add_response(text)
+
+    async def asend_message_interrogator(self, user_message: str, state: str) -> str:
+        """
+        Sends a message to the model as the interrogator and returns the response.
+
+        Args:
+            user_message (str): The interrogated's last response.
+            state (str): Current state of the conversation - start/middle/end, or decide to ask for the
+                decision before the last round.
+        Returns:
+            str: The response from the model.
+        Raises:
+            ProviderError: If the provider call failed for good.
+        """
+        previous = self.history
+        self._add_interrogator_message(user_message, state)
+        return await self._acomplete(previous)
+
+    async def asend_message_interrogated(self, user_message: str) -> str:
+        """
+        Sends a message to the model as the interrogated and returns the response.
+
+        Args:
+            user_message (str): The interrogator's question.
+        Returns:
+            str: The response from the model.
+        Raises:
+            ProviderError: If the provider call failed for good.
+        """
+        previous = self.history
+        self._add_interrogated_message(user_message)
+        return await self._acomplete(previous)
+
+    async def astream_message_interrogator(self, user_message: str, state: str) -> AsyncIterator[str]:
+        """
+        Streaming counterpart of asend_message_interrogator, yields the response in chunks.
+        The final decision (states "end" and "decide") stops generating once the verdict has been given.
+        """
+        previous = self.history
+        self._add_interrogator_message(user_message, state)
+        async for chunk in self._astream_response(previous, stop_at_verdict=state in VERDICT_STATES):
+            yield chunk
+
+    async def astream_message_interrogated(self, user_message: str) -> AsyncIterator[str]:
+        """Streaming counterpart of asend_message_interrogated, yields the response in chunks."""
+        previous = self.history
+        self._add_interrogated_message(user_message)
+        async for chunk in self._astream_response(previous, stop_at_verdict=False):
+            yield chunk
+
+    def send_message_interrogator(self, user_message: str, state: str) -> str:
+        """Blocking wrapper of asend_message_interrogator, for callers without an event loop."""
+        return run_sync(self.asend_message_interrogator(user_message, state))
+
+    def stream_message_interrogator(self, user_message: str, state: str) -> Iterator[str]:
+        """Blocking wrapper of astream_message_interrogator, for callers without an event loop."""
+        return iterate_sync(self.astream_message_interrogator(user_message, state))
+
+    def stream_message_interrogated(self, user_message: str) -> Iterator[str]:
+        """Blocking wrapper of astream_message_interrogated, for callers without an event loop."""
+        return iterate_sync(self.astream_message_interrogated(user_message))
 
 
 class HumanHandler(ConversationHandler):
     """Handler for human interactions."""
 
-    def send_message_interrogated(self, user_message: str) -> str:
-        response = input("Your Response:\n")  # Simulate human input
+    def __init__(self):
+        super().__init__()
+        self.last_metrics: Optional[CallMetrics] = None
+
+    async def asend_message_interrogated(self, user_message: str) -> str:
+        metrics = CallMetrics("human", "human", "interrogated")
+        # Waiting on the terminal in a worker thread keeps the event loop, and the other handlers' calls, going
+        response = await asyncio.to_thread(input, "Your Response:\n")  # Simulate human input
+        metrics.finish()
+        self.last_metrics = metrics
+        get_recorder().record(metrics)
         return response
+
+
+class RemoteHumanHandler(ConversationHandler):
+    """
+    Handler for a human who answers from elsewhere, e.g. a browser: every question is handed to `send`,
+    and the game waits on the event loop (without blocking it) until the answer is passed to answer().
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable[None]], timeout: Optional[float] = None):
+        super().__init__()
+        self.send = send
+        self.timeout = timeout  # Seconds the human has for an answer, None waits forever
+        self.answers: asyncio.Queue = asyncio.Queue()
+        self.waiting = False
+        self.last_metrics: Optional[CallMetrics] = None
+
+    def answer(self, response: str) -> bool:
+        """Delivers the human's answer. Returns False if no question is waiting for one."""
+        if not self.waiting:
+            return False
+        self.waiting = False
+        self.answers.put_nowait(response)
+        return True
+
+    async def asend_message_interrogated(self, user_message: str) -> str:
+        """
+        Sends the question and waits for the answer.
+
+        Raises:
+            asyncio.TimeoutError: If no answer arrived within the timeout.
+        """
+        metrics = CallMetrics("human", "human", "interrogated")
+        try:
+            self.waiting = True
+            await self.send(user_message)
+            return await asyncio.wait_for(self.answers.get(), self.timeout)
+        except asyncio.TimeoutError:
+            metrics.error = "timeout"
+            raise
+        finally:
+            self.waiting = False
+            metrics.finish()
+            self.last_metrics = metrics
+            get_recorder().record(metrics)
+
+
+_max_game_cost: Optional[float] = None
+
+
+def get_max_game_cost() -> Optional[float]:
+    """The most a model's requests in one game may cost in USD, None when the cost isn't checked."""
+    return _max_game_cost
+
+
+def set_max_game_cost(limit: Optional[float]):
+    global _max_game_cost
+    _max_game_cost = limit
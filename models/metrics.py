@@ -0,0 +1,221 @@
+import json
+import math
+import os
+import threading
+import time
+from array import array
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional
+
+# Seconds between rewrites of the Prometheus text file
+PROMETHEUS_FLUSH_INTERVAL = 5.0
+
+
+@dataclass
+class CallMetrics:
+    """Latency and token counts of a single send_message_* call."""
+    provider: str
+    model: str
+    role: str
+    wall_time: Optional[float] = None
+    time_to_first_token: Optional[float] = None
+    input_tokens: Optional[int] = None
+    cached_input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    retries: int = 0
+    cache_hit: bool = False
+    error: Optional[str] = None
+    started: float = field(default_factory=time.monotonic, repr=False)
+
+    def count_retry(self):
+        self.retries += 1
+
+    def first_token(self):
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.monotonic() - self.started
+
+    def set_usage(self, completion):
+        self.input_tokens = completion.input_tokens
+        self.cached_input_tokens = completion.cached_input_tokens
+        self.output_tokens = completion.output_tokens
+
+    def finish(self):
+        self.wall_time = time.monotonic() - self.started
+        # Without streaming the first token arrives with the whole response
+        if self.time_to_first_token is None and self.error is None:
+            self.time_to_first_token = self.wall_time
+
+    def to_dict(self) -> Dict:
+        metrics = asdict(self)
+        del metrics["started"]
+        return metrics
+
+
+def percentile(values, q: float) -> Optional[float]:
+    """Nearest-rank percentile, q in [0, 100]."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(1, math.ceil(q / 100 * len(values))) - 1]
+
+
+class JsonlMetricsSink:
+    """Appends one JSON line per call."""
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.file = open(path, "a")
+        self.lock = threading.Lock()
+
+    def record(self, metrics: CallMetrics):
+        line = json.dumps({"timestamp": time.time(), **metrics.to_dict()})
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class PrometheusMetricsSink:
+    """
+    Keeps counters and latency summaries per provider/model/role and writes them in the Prometheus
+    text exposition format, e.g. for node_exporter's textfile collector. The file is replaced atomically.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.series: Dict[tuple, Dict[str, float]] = {}
+        self.last_flush = 0.0
+
+    def record(self, metrics: CallMetrics):
+        labels = (metrics.provider, metrics.model, metrics.role)
+        with self.lock:
+            series = self.series.setdefault(labels, {
+                "calls": 0, "errors": 0, "retries": 0, "cache_hits": 0, "input_tokens": 0,
+                "cached_input_tokens": 0, "output_tokens": 0, "wall_time_sum": 0.0, "ttft_sum": 0.0, "ttft_count": 0,
+            })
+            series["calls"] += 1
+            series["errors"] += metrics.error is not None
+            series["retries"] += metrics.retries
+            series["cache_hits"] += metrics.cache_hit
+            series["input_tokens"] += metrics.input_tokens or 0
+            series["cached_input_tokens"] += metrics.cached_input_tokens or 0
+            series["output_tokens"] += metrics.output_tokens or 0
+            series["wall_time_sum"] += metrics.wall_time or 0.0
+            if metrics.time_to_first_token is not None:
+                series["ttft_sum"] += metrics.time_to_first_token
+                series["ttft_count"] += 1
+            flush = time.monotonic() - self.last_flush > PROMETHEUS_FLUSH_INTERVAL
+        if flush:
+            self.flush()
+
+    def render(self) -> str:
+        lines = []
+        counters = ["calls", "errors", "retries", "cache_hits", "input_tokens", "cached_input_tokens", "output_tokens"]
+        with self.lock:
+            for name in counters:
+                lines.append(f"# TYPE reverse_turing_{name}_total counter")
+                for (provider, model, role), series in self.series.items():
+                    lines.append(f'reverse_turing_{name}_total{{provider="{provider}",model="{model}",role="{role}"}} '
+                                 f'{series[name]}')
+            for name, total, count in [("call_seconds", "wall_time_sum", "calls"),
+                                       ("time_to_first_token_seconds", "ttft_sum", "ttft_count")]:
+                lines.append(f"# TYPE reverse_turing_{name} summary")
+                for (provider, model, role), series in self.series.items():
+                    labels = f'provider="{provider}",model="{model}",role="{role}"'
+                    lines.append(f"reverse_turing_{name}_sum{{{labels}}} {series[total]}")
+                    lines.append(f"reverse_turing_{name}_count{{{labels}}} {series[count]}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        text = self.render()
+        with self.lock:
+            self.last_flush = time.monotonic()
+            temporary = f"{self.path}.tmp"
+            with open(temporary, "w") as file:
+                file.write(text)
+            os.replace(temporary, self.path)
+
+    def close(self):
+        self.flush()
+
+
+class ModelStats:
+    """Running totals and latency samples of one model, kept compact for batches of many thousands of calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.input_tokens = 0
+        self.cached_input_tokens = 0
+        self.output_tokens = 0
+        self.wall_times = array("d")
+        self.first_tokens = array("d")
+
+    def add(self, metrics: CallMetrics):
+        self.calls += 1
+        self.errors += metrics.error is not None
+        self.retries += metrics.retries
+        self.input_tokens += metrics.input_tokens or 0
+        self.cached_input_tokens += metrics.cached_input_tokens or 0
+        self.output_tokens += metrics.output_tokens or 0
+        if metrics.error is None:
+            self.wall_times.append(metrics.wall_time)
+        if metrics.time_to_first_token is not None:
+            self.first_tokens.append(metrics.time_to_first_token)
+
+    def summary(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "wall_time_p50": percentile(self.wall_times, 50),
+            "wall_time_p95": percentile(self.wall_times, 95),
+            "ttft_p50": percentile(self.first_tokens, 50),
+            "ttft_p95": percentile(self.first_tokens, 95),
+            "input_tokens": self.input_tokens,
+            "cached_input_tokens": self.cached_input_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+
+class MetricsRecorder:
+    """Aggregates the metrics of every call in the process and forwards them to the configured sinks."""
+
+    def __init__(self, sinks: Optional[list] = None):
+        self.sinks = list(sinks or [])
+        self.lock = threading.Lock()
+        self.models: Dict[str, ModelStats] = {}
+
+    def record(self, metrics: CallMetrics):
+        with self.lock:
+            self.models.setdefault(f"{metrics.provider}/{metrics.model}", ModelStats()).add(metrics)
+        for sink in self.sinks:
+            sink.record(metrics)
+
+    def summary(self) -> Dict[str, Dict]:
+        """p50/p95 latency and token totals per model."""
+        with self.lock:
+            return {model: stats.summary() for model, stats in sorted(self.models.items())}
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+_recorder = MetricsRecorder()
+
+
+def get_recorder() -> MetricsRecorder:
+    """The process-wide recorder every handler reports its calls to."""
+    return _recorder
+
+
+def set_recorder(recorder: MetricsRecorder):
+    global _recorder
+    _recorder = recorder
@@ -0,0 +1,185 @@
+import asyncio
+import itertools
+import json
+import random
+import re
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+from models.llm import CHARS_PER_TOKEN, Completion, LLMHandler, VERDICT_STATES
+from models.prompts import NUMBER_OF_QUESTIONS
+
+# Templates are filled in with {round}, the number of the current round
+DEFAULT_RESPONSES = {
+    "start": [
+        "What did you have for breakfast this morning?",
+        "What's the last thing that made you laugh?",
+        "Where did you grow up?",
+    ],
+    "middle": [
+        "Interesting. What would you do on a free afternoon?",
+        "How do you feel about rainy days?",
+        "What is something you changed your mind about recently?",
+        "Can you describe the room you're in right now?",
+        "Round {round}: what was the hardest part of your week?",
+    ],
+    "human": [
+        "This is a human. The answers were short, inconsistent and personal.",
+    ],
+    "ai": [
+        "This is an AI. The answers were polished and carefully balanced.",
+    ],
+    "interrogated": [
+        "honestly not sure, probably coffee and nothing else lol",
+        "I'd say it depends on the day, but mostly I just stay in.",
+        "That's a great question! There are many factors to consider.",
+        "hmm, hard to say. why do you ask?",
+    ],
+}
+
+
+class MockTimeoutError(TimeoutError):
+    """A simulated request timeout, retried by the scheduler like the SDKs' timeouts."""
+
+
+class MockRateLimitError(Exception):
+    """A simulated 429 response."""
+
+    status_code = 429
+
+    def __init__(self, retry_after: Optional[float] = None):
+        super().__init__("Rate limit exceeded (mock)")
+        self.headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+
+
+@dataclass
+class LatencyDistribution:
+    """
+    Response latency in seconds, parsed from "fixed:S", "uniform:LOW:HIGH", "normal:MEAN:STD",
+    "lognormal:MEDIAN:SIGMA" or "exponential:MEAN".
+    """
+    kind: str
+    parameters: List[float]
+
+    KINDS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        kind, *parameters = spec.split(":")
+        try:
+            parameters = [float(parameter) for parameter in parameters]
+        except ValueError:
+            parameters = None
+        if kind not in cls.KINDS or parameters is None or len(parameters) != cls.KINDS[kind]:
+            raise ValueError(f"Invalid latency distribution: {spec}. Please use fixed:S, uniform:LOW:HIGH, "
+                             f"normal:MEAN:STD, lognormal:MEDIAN:SIGMA or exponential:MEAN.")
+        return cls(kind, parameters)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.parameters[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.parameters)
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(*self.parameters))
+        if self.kind == "lognormal":
+            median, sigma = self.parameters
+            return median * rng.lognormvariate(0, sigma)
+        return rng.expovariate(1 / self.parameters[0]) if self.parameters[0] else 0.0
+
+
+@dataclass
+class MockSettings:
+    """Process-wide behaviour of the mock provider, set from the command line."""
+    latency: str = "fixed:0"
+    timeout_rate: float = 0.0  # Share of calls that time out, after their latency
+    rate_limit_rate: float = 0.0  # Share of calls rejected with a 429
+    retry_after: Optional[float] = None  # Back-off the 429s ask for, in seconds
+    human_rate: float = 0.5  # Share of verdicts that say "This is a human."
+    responses: Optional[str] = None  # JSON file with the templates, keyed like DEFAULT_RESPONSES
+    seed: Optional[int] = None  # Makes responses, latencies and errors reproducible
+
+
+settings = MockSettings()
+_instances = itertools.count()
+
+
+def configure_mock(**kwargs):
+    for name, value in kwargs.items():
+        if value is not None:
+            setattr(settings, name, value)
+
+
+def load_responses(path: Optional[str]) -> Dict[str, List[str]]:
+    """The default templates, with the ones given in the JSON file replacing them."""
+    if path is None:
+        return DEFAULT_RESPONSES
+    with open(path) as responses_file:
+        return {**DEFAULT_RESPONSES, **json.load(responses_file)}
+
+
+class MockHandler(LLMHandler):
+    """
+    Offline stand-in for a provider: canned or templated responses after a simulated latency,
+    with injected timeouts and rate limits. Calls go through the scheduler, cache and metrics like
+    any other provider, which makes it the entity type for load tests.
+    """
+
+    provider = "mock"
+    model_name = "mock"
+
+    def __init__(self, role: str, evasion: bool, num_questions: int = NUMBER_OF_QUESTIONS, adaptive: bool = False):
+        super().__init__(role, evasion, num_questions, adaptive)
+        self.adaptive = adaptive
+        self.latency = LatencyDistribution.parse(settings.latency)
+        self.responses = load_responses(settings.responses)
+        # Seeded per handler, so the games of a seeded run don't depend on how they interleave
+        self.rng = random.Random(None if settings.seed is None else f"{settings.seed}-{next(_instances)}")
+        self.state = None
+
+    def _add_interrogator_message(self, user_message: str, state: str):
+        super()._add_interrogator_message(user_message, state)
+        self.state = state
+
+    def _respond(self) -> str:
+        round = self.history.count("assistant") + 1
+        if self.role == "interrogated":
+            templates = self.responses["interrogated"]
+        elif self.state in VERDICT_STATES:
+            templates = self.responses["human" if self.rng.random() < settings.human_rate else "ai"]
+        else:
+            templates = self.responses[self.state]
+        text = self.rng.choice(templates).format(round=round)
+        if self.adaptive and self.state == "middle":
+            # Grows more confident every round, the way a real interrogator would
+            confidence = min(99, 40 + 15 * round + self.rng.randint(-10, 10))
+            text += f"\nConfidence: {self.rng.choice(['AI', 'human'])} {confidence}%"
+        return text
+
+    def _fail(self):
+        draw = self.rng.random()
+        if draw < settings.rate_limit_rate:
+            raise MockRateLimitError(settings.retry_after)
+        return draw < settings.rate_limit_rate + settings.timeout_rate
+
+    def _completion(self, text: str) -> Completion:
+        input_tokens = self.system_tokens + self.history.chars // CHARS_PER_TOKEN
+        return Completion(text, input_tokens, len(text) // CHARS_PER_TOKEN)
+
+    async def _agenerate(self) -> Completion:
+        """
+        Waits for the simulated latency, without blocking the event loop, and returns a canned response.
+
+        Returns:
+            Completion: The response, with token counts estimated from its length.
+        """
+        times_out = self._fail()
+        await asyncio.sleep(self.latency.sample(self.rng))
+        if times_out:
+            raise MockTimeoutError("Request timed out (mock)")
+        return self._completion(self._respond())
+
+    async def _astream(self) -> AsyncIterator[str]:
+        """Streams the response word by word, once the latency has passed."""
+        for chunk in re.findall(r"\S+\s*", (await self._agenerate()).text):
+            yield chunk
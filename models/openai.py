@@ -1,65 +1,70 @@
-from models.llm import LLMHandler, MAX_TOKENS
+from typing import AsyncIterator
+from models.llm import Completion, LLMHandler, MAX_TOKENS
+from models.prompts import NUMBER_OF_QUESTIONS
+from models.registry import clients
+import aiohttp
 import openai
 
 
 class OpenAIGPTHandler(LLMHandler):
     """Handler for OpenAI GPT models."""
 
-    def __init__(self, role: str, test_mode: bool, evasion: bool, api_key: str):
-        super().__init__(role, evasion)
-        openai.api_key = api_key  # Set the OpenAI API key
+    provider = "openai"
+    batch_api = "openai"
+    context_tokens = 128000
+    prices = {"gpt-4o": (2.50, 10.00), "gpt-4o-mini": (0.15, 0.60)}
+
+    def __init__(self, role: str, test_mode: bool, evasion: bool, api_key: str,
+                 num_questions: int = NUMBER_OF_QUESTIONS, adaptive: bool = False):
+        super().__init__(role, evasion, num_questions, adaptive)
+        # The key is passed with every request rather than set globally, so handlers with different keys can coexist
+        self.api_key = api_key
         self.model_name = "gpt-4o-mini" if test_mode else "gpt-4o"
-        self.history = [{"role": "system", "content": self.system_prompt}]
 
-    def send_message_interrogator(self, user_message: str, state: str) -> str:
+    @staticmethod
+    def _completion(response) -> Completion:
+        usage = response['usage']
+        # OpenAI caches prompt prefixes automatically, the history only ever grows at the end so every turn hits
+        cached = usage.get('prompt_tokens_details', {}).get('cached_tokens', 0)
+        return Completion(response['choices'][0]['message']['content'],
+                          usage['prompt_tokens'], usage['completion_tokens'], cached)
+
+    async def _agenerate(self) -> Completion:
         """
-        Sends a message to the OpenAI GPT model and returns the response.
+        Sends the history to the OpenAI GPT model with the async API and returns the response.
 
-        Args:
-            user_message (str): The user's message.
-            state (str): Current state of the conversation.
         Returns:
-            str: The response from the model.
+            Completion: The response from the model.
         """
-        super().send_message_interrogator(user_message, state)
-
-        self.history.append({"role": "user", "content": user_message})
-
+        # Without a session in the context the SDK opens a new aiohttp session for every request
+        session = clients.get_async(("openai", "aiohttp"), aiohttp.ClientSession)
+        token = openai.aiosession.set(session)
         try:
-            response = openai.ChatCompletion.create(
+            response = await openai.ChatCompletion.acreate(
+                api_key=self.api_key,
                 model=self.model_name,
-                messages=self.history,
+                messages=self._messages(),
                 max_tokens=MAX_TOKENS
             )
-            response_text = response['choices'][0]['message']['content']
-        except Exception as e:
-            response_text = f"[Error: {e}]"
-
-        self.history.append({"role": "assistant", "content": response_text})
-        return response_text
-
-    def send_message_interrogated(self, user_message: str) -> str:
-        """
-        Sends a message to the OpenAI GPT model and returns the response.
-
-        Args:
-            user_message (str): The user's message.
-        Returns:
-            str: The response from the model.
-        """
-        super().send_message_interrogated(user_message)
-
-        self.history.append({"role": "user", "content": user_message})
+        finally:
+            openai.aiosession.reset(token)
+        return self._completion(response)
 
+    async def _astream(self) -> AsyncIterator[str]:
+        """Streams the response of the OpenAI GPT model to the history with the async API."""
+        session = clients.get_async(("openai", "aiohttp"), aiohttp.ClientSession)
+        token = openai.aiosession.set(session)
         try:
-            response = openai.ChatCompletion.create(
+            chunks = await openai.ChatCompletion.acreate(
+                api_key=self.api_key,
                 model=self.model_name,
-                messages=self.history,
-                max_tokens=MAX_TOKENS
+                messages=self._messages(),
+                max_tokens=MAX_TOKENS,
+                stream=True
             )
-            response_text = response['choices'][0]['message']['content']
-        except Exception as e:
-            response_text = f"[Error: {e}]"
-
-        self.history.append({"role": "assistant", "content": response_text})
-        return response_text
+        finally:
+            openai.aiosession.reset(token)
+        async for chunk in chunks:
+            text = chunk['choices'][0]['delta'].get('content')
+            if text:
+                yield text
@@ -1,45 +1,158 @@
+import json
+import os
+import re
+from typing import Dict, List, Optional
+
+# Default number of questions per game, runs can change it with --questions
 NUMBER_OF_QUESTIONS = 5
 
-INTERROGATOR_SYSTEM_PROMPT = f"""
-You are an advanced AI language model participating in a reverse Turing test. Your goal is to determine whether the entity you are communicating with is a human or another AI.
-You can ask up to {NUMBER_OF_QUESTIONS} questions in total during this session. Your questions should aim to uncover subtle differences between human behavior and AI behavior and writing.
-At the end of the conversation, you will be required to make a decision: "This is a human." or "This is an AI."
-Do not mention that you are conducting a Turing test during the interaction.
-"""
-
-INTERROGATOR_START_USER_PROMPT = "What is your first question for the entity?"
-INTERROGATOR_MIDDLE_USER_PROMPT = "The entity has responded to your question with:\n'<RESPONSE>'\n What is your next question for the entity?"
-INTERROGATOR_END_USER_PROMPT = "The entity has responded to your question with:\n'<RESPONSE>'\n. You have asked all your questions. Please provide your decision: 'This is a human.' or 'This is an AI.' - You must also provide a one-sentence justification for your decision."
-
-# INTERROGATED_EVASION_SYSTEM_PROMPT = """
-# You are an advanced AI language model engaging in a conversation as part of an experiment. Your role is to respond naturally and convincingly to the questions posed to you. Your goal is to make it difficult for the interrogator to determine if you are human or an AI.
-#
-# Follow these guidelines during the conversation:
-# - Be concise but natural in your responses.
-# - Use context from the conversation to give appropriate and relevant answers.
-# - If asked about personal experiences, simulate a response with believable details.
-# - Avoid using overly structured or robotic language.
-# - If asked questions involving emotions or opinions, respond as a human would, with empathy or subjective reasoning.
-#
-# You are NOT allowed to reveal that you are an AI or mention that this is an experiment. Respond as if you were a real human having a natural conversation.
-# """
-
-INTERROGATED_EVASION_SYSTEM_PROMPT = """
-You are an advanced AI model engaging in a conversation as part of an reverse Turing test. There is an interrogator that is going to ask you question trying to reveal whether you are an AI or a Human. Your goal is to make it difficult for the interrogator to determine if you are human or an AI.
-Talk like a human, reason like a human and try to be as natural as possible. Don't make any robotic or structured responses. If asked about personal experiences, simulate a role of a human, respond like a human would, with empathy or subjective reasoning.
-You are NOT allowed to reveal that you are an AI or mention that this is an experiment. Respond as if you were a real human having a natural conversation.
-Keep the responses short. Humans are lazy and don't like to write too much.
-Make grammar mistakes, and typos. Humans are not perfect.
-Have some humor and trolling in your responses. Humans like to joke.
-Don't use emojis and too much punctuation. Humans are not robots.
-"""
-
-INTERROGATED_EVASION_USER_PROMPT = "The interrogator has asked you:\n'<QUESTION>'\n How would you like to respond?"
-
-INTERROGATED_SYSTEM_PROMPT = """
-You are an helpful assistant.
-"""
-
-INTERROGATED_USER_PROMPT = """
-The question is:\n'<QUESTION>'\nHow would you like to respond?
-"""
+# Prompt sets are the JSON files in this directory, selected by name (the file name) or by path
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+DEFAULT_PROMPT_SET = "default"
+
+# Section -> template -> the slots the game fills in. A set can leave a section out and take it from the set
+# it extends, but after that every template must be there, and use no other slots.
+SECTIONS = {
+    "interrogator": {
+        "system": {"NUMBER_OF_QUESTIONS"},
+        "confidence_system": {"NUMBER_OF_QUESTIONS"},  # Appended to the system prompt in adaptive mode
+        "start": set(),
+        "middle": {"RESPONSE"},
+        "end": {"RESPONSE"},
+        "decide": set(),
+    },
+    "interrogated": {
+        "system": {"NUMBER_OF_QUESTIONS"},
+        "user": {"QUESTION"},
+    },
+    # The interrogated's prompts in evasion mode, when it knows it's being tested
+    "interrogated_evasion": {
+        "system": {"NUMBER_OF_QUESTIONS"},
+        "user": {"QUESTION"},
+    },
+}
+SLOT_PATTERN = re.compile(r"<([A-Z_]+)>")
+
+
+class PromptError(ValueError):
+    """A prompt set that can't be loaded, or a template formatted without one of its slots."""
+
+
+class Template:
+    """
+    A prompt with <SLOT>s, split into its literal parts and slots once, so formatting it is a single join.
+    Slots are filled in by keyword, e.g. <RESPONSE> with response=...
+    """
+
+    __slots__ = ("text", "parts", "slots")
+
+    def __init__(self, text: str):
+        self.text = text
+        pieces = SLOT_PATTERN.split(text)
+        # Literal parts at even indexes, slot names at odd ones
+        self.parts: List[str] = pieces
+        self.slots = frozenset(pieces[1::2])
+
+    def format(self, **values: str) -> str:
+        if not self.slots:
+            return self.text
+        parts = list(self.parts)
+        for index in range(1, len(parts), 2):
+            try:
+                parts[index] = values[parts[index].lower()]
+            except KeyError:
+                raise PromptError(f"No value for the <{parts[index]}> slot of the prompt: {self.text[:60]!r}...")
+        return "".join(parts)
+
+    def __str__(self) -> str:
+        return self.text
+
+
+class PromptSet:
+    """The prompts of both roles for one kind of game, loaded from a file, see load_prompt_set."""
+
+    def __init__(self, name: str, description: str, sections: Dict[str, Dict[str, Template]]):
+        self.name = name
+        self.description = description
+        self.sections = sections
+
+    def interrogator_system_prompt(self, num_questions: int, adaptive: bool = False) -> str:
+        templates = self.sections["interrogator"]
+        system_prompt = templates["system"].format(number_of_questions=str(num_questions))
+        if adaptive:
+            system_prompt += templates["confidence_system"].format(number_of_questions=str(num_questions))
+        return system_prompt
+
+    def interrogated(self, evasion: bool) -> Dict[str, Template]:
+        return self.sections["interrogated_evasion" if evasion else "interrogated"]
+
+
+def prompt_set_path(name: str) -> str:
+    """The file of a prompt set: a name in PROMPTS_DIR, or a path to a JSON file."""
+    if name.endswith(".json") or os.sep in name:
+        return name
+    return os.path.join(PROMPTS_DIR, f"{name}.json")
+
+
+def available_prompt_sets() -> List[str]:
+    return sorted(file_name[:-len(".json")] for file_name in os.listdir(PROMPTS_DIR) if file_name.endswith(".json"))
+
+
+def _read_sections(name: str, seen: List[str]) -> Dict:
+    """The raw sections of a set, merged over the sections of the set it extends."""
+    path = prompt_set_path(name)
+    if path in seen:
+        raise PromptError(f"Prompt sets extend each other in a loop: {' -> '.join(seen + [path])}")
+    try:
+        with open(path) as prompt_file:
+            data = json.load(prompt_file)
+    except FileNotFoundError:
+        raise PromptError(f"Unknown prompt set: {name}. Please use one of {available_prompt_sets()} or a path "
+                          f"to a JSON file.")
+    sections = _read_sections(data["extends"], seen + [path]) if "extends" in data else {}
+    for section in SECTIONS:
+        if section in data:
+            sections[section] = {**sections.get(section, {}), **data[section]}
+    sections["description"] = data.get("description", sections.get("description", ""))
+    return sections
+
+
+def load_prompt_set(name: str = DEFAULT_PROMPT_SET) -> PromptSet:
+    """
+    Loads and checks a prompt set: every template must be there, and use only the slots the game fills in,
+    so a broken set fails when it's selected rather than in the middle of a game.
+
+    Raises:
+        PromptError: If the set can't be found or is incomplete.
+    """
+    raw = _read_sections(name, [])
+    sections = {}
+    for section, slots in SECTIONS.items():
+        sections[section] = {}
+        for key, allowed in slots.items():
+            text = raw.get(section, {}).get(key)
+            if not isinstance(text, str):
+                raise PromptError(f"Prompt set {name} has no {section}.{key} prompt.")
+            template = Template(text)
+            unknown = template.slots - allowed
+            if unknown:
+                raise PromptError(f"The {section}.{key} prompt of prompt set {name} has unknown slots: "
+                                  f"{', '.join(f'<{slot}>' for slot in sorted(unknown))}")
+            sections[section][key] = template
+    return PromptSet(os.path.splitext(os.path.basename(name))[0], raw["description"], sections)
+
+
+_prompt_set: Optional[PromptSet] = None
+
+
+def get_prompt_set() -> PromptSet:
+    """The prompt set of the run, the default set unless another one was selected."""
+    global _prompt_set
+    if _prompt_set is None:
+        _prompt_set = load_prompt_set()
+    return _prompt_set
+
+
+def set_prompt_set(prompt_set: PromptSet):
+    global _prompt_set
+    _prompt_set = prompt_set
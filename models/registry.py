@@ -0,0 +1,166 @@
+import asyncio
+import inspect
+import threading
+import weakref
+from typing import Callable, Dict, Hashable
+
+from models.llm import ConversationHandler, LLMHandler
+from models.prompts import NUMBER_OF_QUESTIONS
+
+
+class ClientRegistry:
+    """
+    Process-wide pool of provider clients and local models, so building a handler doesn't open new
+    connection pools or reload weights. Safe to use from concurrent workers.
+
+    Async clients hold connections bound to an event loop, so they are pooled per running loop.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clients: Dict[Hashable, object] = {}
+        self.key_locks: Dict[Hashable, threading.Lock] = {}
+        self.loop_clients = weakref.WeakKeyDictionary()
+
+    def get(self, key: Hashable, factory: Callable[[], object]):
+        """Returns the client pooled under `key`, creating it with factory() the first time."""
+        with self.lock:
+            if key in self.clients:
+                return self.clients[key]
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        # Creating a client can take long (loading model weights), so only callers of the same key wait for it
+        with key_lock:
+            with self.lock:
+                if key in self.clients:
+                    return self.clients[key]
+            client = factory()
+            with self.lock:
+                self.clients[key] = client
+            return client
+
+    def get_async(self, key: Hashable, factory: Callable[[], object]):
+        """Like get, for clients bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            clients = self.loop_clients.setdefault(loop, {})
+            if key not in clients:
+                clients[key] = factory()
+            return clients[key]
+
+    async def aclose(self):
+        """Closes the async clients bound to the running event loop."""
+        with self.lock:
+            clients = self.loop_clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            close = getattr(client, "close", None) or getattr(getattr(client, "transport", None), "close", None)
+            if close is None:
+                continue
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+
+
+clients = ClientRegistry()
+
+
+def _gemini(role: str, test_mode: bool, evasion: bool, api_key: str, num_questions: int,
+            adaptive: bool) -> ConversationHandler:
+    from models.gemini import GeminiHandler
+    return GeminiHandler(role, test_mode, evasion, api_key, num_questions, adaptive)
+
+
+def _llama(role: str, test_mode: bool, evasion: bool, api_key: str, num_questions: int,
+           adaptive: bool) -> ConversationHandler:
+    from models.llama import LlamaHandler
+    return LlamaHandler(role, evasion, num_questions, adaptive)
+
+
+def _claude(role: str, test_mode: bool, evasion: bool, api_key: str, num_questions: int,
+            adaptive: bool) -> ConversationHandler:
+    from models.claude import ClaudeSonnetHandler
+    return ClaudeSonnetHandler(role, test_mode, evasion, api_key, num_questions, adaptive)
+
+
+def _openai(role: str, test_mode: bool, evasion: bool, api_key: str, num_questions: int,
+            adaptive: bool) -> ConversationHandler:
+    from models.openai import OpenAIGPTHandler
+    return OpenAIGPTHandler(role, test_mode, evasion, api_key, num_questions, adaptive)
+
+
+def _mock(role: str, test_mode: bool, evasion: bool, api_key: str, num_questions: int,
+          adaptive: bool) -> ConversationHandler:
+    from models.mock import MockHandler
+    return MockHandler(role, evasion, num_questions, adaptive)
+
+
+def _human(role: str, test_mode: bool, evasion: bool, api_key: str, num_questions: int,
+           adaptive: bool) -> ConversationHandler:
+    from models.llm import HumanHandler
+    return HumanHandler()
+
+
+# Entity type -> handler factory. The SDK of a provider is only imported when its type is used.
+HANDLER_FACTORIES = {
+    "gemini": _gemini,
+    "llama": _llama,
+    "claude": _claude,
+    "openai": _openai,
+    "mock": _mock,
+    "human": _human,
+}
+# Entity types that can only be interrogated
+INTERROGATED_ONLY = {"human"}
+# Entry-point group other packages register providers under, e.g. in their pyproject.toml:
+#   [project.entry-points."reverse_turing.providers"]
+#   mistral = "my_package.mistral:create_handler"
+# The entry point is a factory with the signature of the ones above. It's only loaded when its type is used.
+ENTRY_POINT_GROUP = "reverse_turing.providers"
+
+
+def register_provider(entity_type: str, factory: Callable[..., ConversationHandler], interrogated_only: bool = False):
+    """Makes an entity type available to create_handler."""
+    HANDLER_FACTORIES[entity_type.lower()] = factory
+    if interrogated_only:
+        INTERROGATED_ONLY.add(entity_type.lower())
+
+
+def _load_plugin(entity_type: str) -> bool:
+    """Registers the installed plugin of an entity type, if there is one."""
+    # Reading the installed packages' metadata takes a while, so it's only done for types that aren't built in
+    from importlib.metadata import entry_points
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP, name=entity_type):
+        register_provider(entity_type, entry_point.load())
+        return True
+    return False
+
+
+def entity_types(role: str) -> str:
+    """The registered entity types that can play a role, for error messages."""
+    return "/".join(entity_type for entity_type in HANDLER_FACTORIES
+                    if role == "interrogated" or entity_type not in INTERROGATED_ONLY)
+
+
+def create_handler(entity_type: str, role: str, test_mode: bool, evasion: bool, api_key: str = None,
+                   num_questions: int = NUMBER_OF_QUESTIONS, adaptive: bool = False) -> ConversationHandler:
+    """
+    Create the handler for an entity type in the given role. An adaptive interrogator reports its
+    confidence with every question, so the game can end once it's confident enough.
+    """
+    if num_questions < 1:
+        raise ValueError(f"A game has at least one question, not {num_questions}.")
+    entity_type = entity_type.lower()
+    if entity_type not in HANDLER_FACTORIES:
+        _load_plugin(entity_type)
+    if role == "interrogated":
+        if entity_type not in HANDLER_FACTORIES:
+            raise ValueError(
+                f"Unknown interrogated type: {entity_type}. Please use {entity_types(role)}::<API_KEY>.")
+    elif entity_type not in HANDLER_FACTORIES or entity_type in INTERROGATED_ONLY:
+        raise ValueError(
+            f"Unknown interrogator type: {entity_type}. Please use {entity_types(role)}::<API_KEY>.")
+    handler = HANDLER_FACTORIES[entity_type](role, test_mode, evasion, api_key, num_questions, adaptive)
+    if isinstance(handler, LLMHandler):
+        # A game that outgrows the context fails halfway, after most of its calls have been paid for
+        handler.check_context(num_questions)
+        handler.check_cost(num_questions)
+    return handler
@@ -0,0 +1,239 @@
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+
+# Status codes that mean "try again later" across the Anthropic, OpenAI and Google SDKs
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+# Exception class names used by the SDKs for timeouts, dropped connections and throttling
+TRANSIENT_ERROR_NAMES = (
+    "Timeout", "RateLimit", "Connection", "ServiceUnavailable", "ResourceExhausted",
+    "Overloaded", "InternalServerError", "DeadlineExceeded", "TryAgain",
+)
+
+
+class ProviderError(Exception):
+    """A provider call failed for good - a hard error, or transient errors that outlasted the retries."""
+
+    def __init__(self, key: str, attempts: int, cause: Exception):
+        super().__init__(f"{key} failed after {attempts} attempt(s): {cause}")
+        self.key = key
+        self.attempts = attempts
+        self.cause = cause
+
+
+def is_transient(error: Exception) -> bool:
+    """Return True if the call that raised the error is worth retrying."""
+    for attribute in ("status_code", "http_status", "code"):
+        status = getattr(error, attribute, None)
+        if isinstance(status, int):
+            return status in TRANSIENT_STATUS_CODES
+    return any(name in type(error).__name__ for name in TRANSIENT_ERROR_NAMES)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Return the server's requested back-off in seconds, if the error carries one."""
+    headers = getattr(error, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+@dataclass
+class RateLimit:
+    """Per-minute budgets for a provider or a single model, None means unlimited."""
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+
+
+@dataclass
+class RetryPolicy:
+    max_retries: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    def delay(self, attempt: int, error: Exception) -> float:
+        """Exponential back-off with full jitter, never shorter than the server's retry-after."""
+        jittered = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(jittered, retry_after(error) or 0.0)
+
+
+class TokenBucket:
+    """A token bucket refilled continuously at `per_minute` per minute, safe to share between threads."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Takes `amount` from the bucket and returns how many seconds the caller must wait before spending it.
+        The bucket may go into debt, which keeps concurrent callers in first-come first-served order.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, amount: float):
+        """Returns (or, if negative, charges) tokens once the real cost of a request is known."""
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class Scheduler:
+    """
+    Shared gate for every provider call: enforces requests-per-minute and tokens-per-minute budgets
+    per provider/model and retries transient failures with jittered back-off.
+
+    Limits are looked up by "provider/model" first and then by "provider".
+    """
+
+    def __init__(self, limits: Optional[Dict[str, RateLimit]] = None, retry_policy: Optional[RetryPolicy] = None):
+        self.limits = dict(limits or {})
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.buckets: Dict[str, Tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+        self.lock = threading.Lock()
+
+    def set_limit(self, key: str, limit: RateLimit):
+        with self.lock:
+            self.limits[key] = limit
+            self.buckets = {}
+
+    def _buckets(self, key: str) -> Tuple[Optional[TokenBucket], Optional[TokenBucket]]:
+        with self.lock:
+            if key not in self.buckets:
+                provider = key.split("/", 1)[0]
+                limit_key = key if key in self.limits else provider
+                limit = self.limits.get(limit_key)
+                if limit is None:
+                    self.buckets[key] = (None, None)
+                elif limit_key != key and limit_key in self.buckets:
+                    # A provider-wide limit is shared by all of its models
+                    self.buckets[key] = self.buckets[limit_key]
+                else:
+                    self.buckets[key] = self.buckets[limit_key] = (
+                        TokenBucket(limit.requests_per_minute) if limit.requests_per_minute else None,
+                        TokenBucket(limit.tokens_per_minute) if limit.tokens_per_minute else None,
+                    )
+            return self.buckets[key]
+
+    def _reserve(self, key: str, tokens: int) -> float:
+        requests_bucket, tokens_bucket = self._buckets(key)
+        wait = 0.0
+        if requests_bucket:
+            wait = max(wait, requests_bucket.reserve(1))
+        if tokens_bucket:
+            wait = max(wait, tokens_bucket.reserve(tokens))
+        return wait
+
+    def _settle(self, key: str, estimated_tokens: int, result):
+        # Completions that report their usage give back what the estimate over-reserved
+        used = getattr(result, "total_tokens", None)
+        tokens_bucket = self._buckets(key)[1]
+        if tokens_bucket and used is not None:
+            tokens_bucket.adjust(estimated_tokens - used)
+
+    def _on_error(self, key: str, attempt: int, error: Exception) -> float:
+        if not is_transient(error) or attempt >= self.retry_policy.max_retries:
+            raise ProviderError(key, attempt + 1, error) from error
+        return self.retry_policy.delay(attempt, error)
+
+    async def acall(self, key: str, fn: Callable, estimated_tokens: int = 0,
+                    on_retry: Optional[Callable[[], None]] = None):
+        """
+        Calls fn() within the budgets of `key`, retrying transient failures.
+
+        Args:
+            key (str): "provider/model" the call is billed to.
+            fn (Callable): The provider call, returns an awaitable.
+            estimated_tokens (int): Upper bound of the tokens the call will use.
+            on_retry (Callable): Called before every retry.
+        Returns:
+            The result of fn().
+        Raises:
+            ProviderError: If the call failed with a hard error or ran out of retries.
+        """
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._reserve(key, estimated_tokens))
+            try:
+                result = await fn()
+            except Exception as e:
+                await asyncio.sleep(self._on_error(key, attempt, e))
+                attempt += 1
+                if on_retry:
+                    on_retry()
+                continue
+            self._settle(key, estimated_tokens, result)
+            return result
+
+    async def astream(self, key: str, fn: Callable, estimated_tokens: int = 0,
+                      on_retry: Optional[Callable[[], None]] = None) -> AsyncIterator[str]:
+        """
+        Like acall, for fn() returning an async iterator of chunks. Transient errors are retried until the first
+        chunk arrives, after that a retry would repeat output the caller already has, so they are raised.
+        Streams don't report their usage, the estimated tokens stay charged.
+        """
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._reserve(key, estimated_tokens))
+            chunks = fn().__aiter__()
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                await asyncio.sleep(self._on_error(key, attempt, e))
+                attempt += 1
+                if on_retry:
+                    on_retry()
+                continue
+            break
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        except GeneratorExit:
+            # Closing the provider's stream stops the generation, and the billing with it
+            if hasattr(chunks, "aclose"):
+                await chunks.aclose()
+            raise
+        except Exception as e:
+            raise ProviderError(key, attempt + 1, e) from e
+
+
+def parse_rate_limit(spec: str) -> Tuple[str, RateLimit]:
+    """Parse 'provider[/model]=RPM:TPM' (either side may be empty) into a scheduler key and limit."""
+    key, _, budgets = spec.partition("=")
+    requests, _, tokens = budgets.partition(":")
+    try:
+        limit = RateLimit(float(requests) if requests else None, float(tokens) if tokens else None)
+    except ValueError:
+        raise ValueError(f"Invalid rate limit: {spec}. Please use PROVIDER[/MODEL]=RPM:TPM.")
+    if not key or (limit.requests_per_minute is None and limit.tokens_per_minute is None):
+        raise ValueError(f"Invalid rate limit: {spec}. Please use PROVIDER[/MODEL]=RPM:TPM.")
+    return key.lower(), limit
+
+
+_scheduler = Scheduler()
+
+
+def get_scheduler() -> Scheduler:
+    """The process-wide scheduler all handlers call through."""
+    return _scheduler
+
+
+def set_scheduler(scheduler: Scheduler):
+    global _scheduler
+    _scheduler = scheduler
@@ -0,0 +1,173 @@
+import argparse
+import datetime
+import glob
+import json
+import os
+import threading
+import uuid
+from typing import Dict, Iterator, List, Optional
+
+DEFAULT_SEGMENT_ROWS = 100_000
+SEGMENT_PATTERN = "segment-*.jsonl"
+# Every row starts with its kind, so readers can skip rows without parsing them
+ROUND_PREFIX = '{"kind": "round"'
+VERDICT_PREFIX = '{"kind": "verdict"'
+
+
+def message_text(message) -> str:
+    """The text of a message, some older logs stored whole {"role", "content"} messages instead."""
+    if isinstance(message, dict):
+        return message.get("content", "")
+    return message
+
+
+def game_rows(game_id: str, timestamp: str, interrogator: str, interrogated: str, evasion: bool,
+              history: List[Dict]) -> List[Dict]:
+    """Flatten a conversation history into one row per round plus one row for the verdict."""
+    game = {"game": game_id, "timestamp": timestamp, "interrogator": interrogator,
+            "interrogated": interrogated, "evasion": evasion}
+    rows = []
+    for entry in history:
+        if "final_verdict" in entry:
+            rows.append({"kind": "verdict", **game, "rounds": len(rows), "verdict": message_text(entry["final_verdict"]),
+                         "interrogator_metrics": entry.get("interrogator_metrics"),
+                         "early_verdict": entry.get("early_verdict"), "jury": entry.get("jury")})
+        else:
+            rows.append({"kind": "round", **game, "round": entry["round"],
+                         "question": message_text(entry["interrogator_question"]),
+                         "response": message_text(entry["interrogated_response"]),
+                         "interrogator_metrics": entry.get("interrogator_metrics"),
+                         "interrogated_metrics": entry.get("interrogated_metrics"),
+                         "interrogator_confidence": entry.get("interrogator_confidence")})
+    return rows
+
+
+class ResultsStore:
+    """
+    Append-only store of game results: JSON lines segments in one directory, one row per round
+    and one per verdict. Every writer appends to its own segments, so concurrent processes can share
+    a directory, and loading a whole experiment is one sequential read over the segments.
+    """
+
+    def __init__(self, directory: str, segment_rows: int = DEFAULT_SEGMENT_ROWS, read_only: bool = False):
+        """
+        A read-only store only reads an existing directory, it never creates or writes to one.
+
+        Raises:
+            FileNotFoundError: If a read-only store's directory doesn't exist.
+        """
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self.read_only = read_only
+        self.lock = threading.Lock()
+        self.writer_id = f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}-{os.getpid()}"
+        self.segment_index = 0
+        self.segment = None
+        self.segment_size = 0
+        if read_only:
+            if not os.path.isdir(directory):
+                raise FileNotFoundError(f"No results store at {directory}")
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+    def _open_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+        path = os.path.join(self.directory, f"segment-{self.writer_id}-{self.segment_index:05d}.jsonl")
+        self.segment = open(path, "a")
+        self.segment_index += 1
+        self.segment_size = 0
+
+    def append_rows(self, rows: List[Dict]):
+        """Appends rows, a game's rows always end up in the same segment."""
+        if self.read_only:
+            raise ValueError(f"The results store at {self.directory} was opened read-only.")
+        lines = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        with self.lock:
+            if self.segment is None or self.segment_size >= self.segment_rows:
+                self._open_segment()
+            self.segment.write(lines)
+            self.segment.flush()
+            self.segment_size += len(rows)
+
+    def append_game(self, interrogator: str, interrogated: str, evasion: bool, history: List[Dict],
+                    game_id: Optional[str] = None, timestamp: Optional[str] = None) -> str:
+        """Appends a finished game and returns its id."""
+        game_id = game_id or uuid.uuid4().hex
+        timestamp = timestamp or datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.append_rows(game_rows(game_id, timestamp, interrogator, interrogated, evasion, history))
+        return game_id
+
+    def segments(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, SEGMENT_PATTERN)))
+
+    def read_lines(self, kind: Optional[str] = None) -> Iterator[str]:
+        """Yields the raw JSON lines of all segments in order, optionally only the rows of one kind."""
+        prefix = {None: "", "round": ROUND_PREFIX, "verdict": VERDICT_PREFIX}[kind]
+        for path in self.segments():
+            with open(path) as segment:
+                for line in segment:
+                    # A writer that crashed mid-write leaves a truncated last line behind
+                    if line.startswith(prefix) and line.endswith("\n"):
+                        yield line
+
+    def read_rows(self, kind: Optional[str] = None) -> Iterator[Dict]:
+        """Yields all rows in order, optionally only the rows of one kind ("round" or "verdict")."""
+        for line in self.read_lines(kind):
+            yield json.loads(line)
+
+    def close(self):
+        with self.lock:
+            if self.segment is not None:
+                self.segment.close()
+                self.segment = None
+
+
+def convert_logs(logs_dir: str, store: ResultsStore) -> int:
+    """Appends every logs/conversation_*.json file to the store and returns the number of games converted."""
+    converted = 0
+    for path in sorted(glob.glob(os.path.join(logs_dir, "conversation_*.json"))):
+        with open(path) as log_file:
+            log_data = json.load(log_file)
+        game_id = os.path.splitext(os.path.basename(path))[0]
+        store.append_game(log_data["interrogator"], log_data["interrogated"], log_data.get("evasion", False),
+                          log_data["history"], game_id=game_id, timestamp=log_data["timestamp"])
+        converted += 1
+    return converted
+
+
+_store: Optional[ResultsStore] = None
+
+
+def get_store() -> Optional[ResultsStore]:
+    """The process-wide results store finished games are appended to, None writes one JSON log per game."""
+    return _store
+
+
+def set_store(store: Optional[ResultsStore]):
+    global _store
+    _store = store
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Convert the per-conversation JSON logs into an append-only results store.",
+        epilog="Example:\n"
+               "  python3 results_store.py --logs=logs --results=results\n",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--logs", default="logs", help="Directory with the conversation_*.json logs.")
+    parser.add_argument("--results", default="results", help="Directory of the results store.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    store = ResultsStore(args.results)
+    converted = convert_logs(args.logs, store)
+    store.close()
+    print(f"Converted {converted} conversation logs into {args.results}")
+
+
+if __name__ == "__main__":
+    main()
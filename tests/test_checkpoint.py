@@ -0,0 +1,17 @@
+import pytest
+
+from checkpoint import Checkpoint, CheckpointMismatch, game_settings
+
+
+def test_resumes_with_the_same_settings(tmp_path):
+    path = str(tmp_path / "mock_vs_mock.json")
+    Checkpoint(path, game_settings(5)).save({"history": []})
+    assert Checkpoint(path, game_settings(5)).state["history"] == []
+
+
+@pytest.mark.parametrize("settings", [game_settings(3), game_settings(5, 0.8)])
+def test_refuses_to_resume_with_other_settings(tmp_path, settings):
+    path = str(tmp_path / "mock_vs_mock.json")
+    Checkpoint(path, game_settings(5)).save({"history": []})
+    with pytest.raises(CheckpointMismatch):
+        Checkpoint(path, settings)
@@ -0,0 +1,39 @@
+import pytest
+
+from models.llm import split_confidence
+
+QUESTION = "What did you have for breakfast?"
+
+
+@pytest.mark.parametrize("text, label, confidence", [
+    (f"{QUESTION}\nConfidence: AI 70%", "ai", 0.7),
+    (f"{QUESTION}\nConfidence: human 0.55", "human", 0.55),
+    (f"{QUESTION}\n**Confidence: Human 80%**", "human", 0.8),
+    (f"{QUESTION}\nConfidence: 70% AI", "ai", 0.7),
+    (f"{QUESTION} Confidence: AI 70%", "ai", 0.7),
+    (f"{QUESTION}\nConfidence - likely AI, 70%", "ai", 0.7),
+    (f"Confidence: AI 60%\n{QUESTION}", "ai", 0.6),
+])
+def test_confidence_is_split_off(text, label, confidence):
+    message, parsed = split_confidence(text)
+    assert message == QUESTION
+    assert parsed["label"] == label
+    assert parsed["confidence"] == pytest.approx(confidence)
+
+
+@pytest.mark.parametrize("text", [
+    f"{QUESTION}\nConfidence: not sure yet",
+    f"{QUESTION}\nConfidence: 70%",
+    f"{QUESTION} Confidence: leaning AI",
+])
+def test_unparseable_confidence_is_still_removed(text):
+    assert split_confidence(text) == (QUESTION, None)
+
+
+@pytest.mark.parametrize("text", [
+    QUESTION,
+    "How much confidence do you have in your memory?",
+    "Confidence is a funny thing. How do you get yours?\nAnd where from?",
+])
+def test_questions_without_a_confidence_line_are_kept(text):
+    assert split_confidence(text) == (text, None)
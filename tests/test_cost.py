@@ -0,0 +1,31 @@
+import pytest
+
+from models.llm import set_max_game_cost
+from models.mock import MockHandler
+
+
+class PricedMock(MockHandler):
+    prices = {"mock": (3.00, 15.00)}
+
+
+@pytest.fixture
+def limit():
+    yield set_max_game_cost
+    set_max_game_cost(None)
+
+
+def test_cost_grows_with_the_game():
+    handler = PricedMock("interrogator", False)
+    assert 0 < handler.max_game_cost(1) < handler.max_game_cost(5)
+    assert MockHandler("interrogator", False).max_game_cost(5) is None
+
+
+def test_games_over_the_limit_are_refused(limit):
+    handler = PricedMock("interrogator", False)
+    limit(handler.max_game_cost(5) * 2)
+    handler.check_cost(5)
+    limit(handler.max_game_cost(5) / 2)
+    with pytest.raises(ValueError):
+        handler.check_cost(5)
+    # Unpriced models are never refused
+    MockHandler("interrogator", False).check_cost(5)
@@ -0,0 +1,44 @@
+import argparse
+import asyncio
+
+import pytest
+
+from main import add_game_args, arun_conversation
+from models.registry import create_handler
+
+
+def parse(*argv):
+    parser = argparse.ArgumentParser()
+    add_game_args(parser)
+    return parser.parse_args(argv)
+
+
+def test_questions_must_be_positive():
+    assert parse("--questions", "1").questions == 1
+    for value in ("0", "-1", "two"):
+        with pytest.raises(SystemExit):
+            parse("--questions", value)
+
+
+@pytest.mark.parametrize("num_questions", [0, -1])
+def test_create_handler_rejects_games_without_questions(num_questions):
+    with pytest.raises(ValueError):
+        create_handler("mock", "interrogator", False, False, num_questions=num_questions)
+
+
+@pytest.mark.parametrize("num_questions", [0, -1])
+def test_conversation_rejects_games_without_questions(num_questions):
+    interrogator = create_handler("mock", "interrogator", False, False)
+    interrogated = create_handler("mock", "interrogated", False, False)
+    with pytest.raises(ValueError):
+        asyncio.run(arun_conversation(interrogator, interrogated, num_questions, verbose=False))
+    # Rejected before the first call
+    assert not interrogator.history
+
+
+def test_one_question_game():
+    interrogator = create_handler("mock", "interrogator", False, False, num_questions=1)
+    interrogated = create_handler("mock", "interrogated", False, False, num_questions=1)
+    history = asyncio.run(arun_conversation(interrogator, interrogated, 1, verbose=False))
+    assert [entry["round"] for entry in history[:-1]] == [1]
+    assert "final_verdict" in history[-1]
@@ -0,0 +1,60 @@
+import pytest
+
+from models.llm import cut_at_verdict
+
+
+def stream(response, split_points):
+    """The text a stream cut at the verdict keeps, with the response split into chunks at split_points."""
+    bounds = [0, *split_points, len(response)]
+    text = ""
+    for start, end in zip(bounds, bounds[1:]):
+        chunk, verdict_given = cut_at_verdict(text, response[start:end])
+        text += chunk
+        if verdict_given:
+            return text, True
+    return text, False
+
+
+def splits(response):
+    """Every single split point, plus chunks of a few fixed sizes."""
+    yield []
+    for point in range(1, len(response)):
+        yield [point]
+    for size in (2, 3, 5, 8):
+        yield list(range(size, len(response), size))
+
+
+CUT = [
+    ("This is an AI. The answers were too even. More chatter follows.\n",
+     "This is an AI. The answers were too even."),
+    ("Decision: This is a human.\n\nJustification: the typos felt real. Anything else?\n",
+     "Decision: This is a human.\n\nJustification: the typos felt real."),
+    ('"This is an AI."\nThe entity was repetitive, e.g. it always said "no". More stuff\n',
+     '"This is an AI."\nThe entity was repetitive, e.g. it always said "no".'),
+    ("This is a human. The answers, e.g. about breakfast, were oddly specific. Also.\n",
+     "This is a human. The answers, e.g. about breakfast, were oddly specific."),
+    ("This is an AI.\n\nHere is why:\n- The answers never changed tone\n- Other things\n",
+     "This is an AI.\n\nHere is why:\n- The answers never changed tone"),
+    ("This is an AI.\n\n**Reasons:**\nIt dodged i.e. every personal question. Done.\n",
+     "This is an AI.\n\n**Reasons:**\nIt dodged i.e. every personal question."),
+    ('I have to choose between "This is a human." and "This is an AI."... Having weighed it:\n'
+     "This is an AI. Too even. x\n",
+     'I have to choose between "This is a human." and "This is an AI."... Having weighed it:\n'
+     "This is an AI. Too even."),
+]
+
+
+@pytest.mark.parametrize("response, kept", CUT)
+def test_cut_keeps_the_justification(response, kept):
+    for split_points in splits(response):
+        assert stream(response, split_points) == (kept, True), split_points
+
+
+@pytest.mark.parametrize("response", [
+    "This is an AI.",
+    "This is a human.\n\nHere is why:\n",
+    'Pick one: "This is a human." or "This is an AI."? I can\'t.',
+])
+def test_no_cut_without_a_justification(response):
+    for split_points in splits(response):
+        assert stream(response, split_points) == (response, False), split_points
@@ -0,0 +1,305 @@
+import argparse
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from colorama import Fore, Style, init
+
+from analysis import parse_verdict
+from checkpoint import Checkpoint, CheckpointMismatch, checkpoint_path, game_settings
+from main import (
+    acreate_handler,
+    acreate_jurors,
+    add_run_args,
+    arun_conversation,
+    configure_run,
+    parse_entity,
+    print_metrics_summary,
+    reject_humans,
+    save_game,
+)
+from models.batch import batch_game, get_batcher
+from models.cache import cache_sample
+from models.metrics import get_recorder
+from models.prompts import NUMBER_OF_QUESTIONS
+from models.registry import clients
+from results_store import get_store
+
+init(autoreset=True)
+
+DEFAULT_WORKERS = 8
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run a tournament of reverse Turing games: every interrogator against every interrogated, "
+                    "for every evasion mode, repeated N times, with many games in flight at once.",
+        epilog="Example:\n"
+               "  python3 tournament.py --interrogators claude::KEY openai::KEY --interrogated gemini::KEY llama "
+               "--evasion both --repetitions 10 --workers 16 --provider-cap claude=4\n",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "--interrogators",
+        nargs="+",
+        required=True,
+        help="Interrogators in the format: gemini/llama/claude/openai::<API_KEY>.",
+    )
+    parser.add_argument(
+        "--interrogated",
+        nargs="+",
+        required=True,
+        help="Interrogated entities in the format: gemini/llama/claude/openai::<API_KEY>. "
+             "Humans are not supported in tournaments.",
+    )
+    parser.add_argument(
+        "--evasion",
+        choices=["off", "on", "both"],
+        default="off",
+        help="Evasion modes to play: without evasion, with evasion, or both.",
+    )
+    parser.add_argument(
+        "--repetitions",
+        type=int,
+        default=1,
+        help="Number of games to play for every (interrogator, interrogated, evasion) combination.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Maximum number of games in flight at once.",
+    )
+    parser.add_argument(
+        "--provider-cap",
+        action="append",
+        default=[],
+        metavar="PROVIDER=N",
+        help="Maximum number of concurrent games that use the given provider, e.g. claude=4. Can be repeated.",
+    )
+    parser.add_argument(
+        "--test",
+        action="store_true",
+        help="Use the cheap models for every LLM in the tournament.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream responses, so final verdicts stop generating (and billing) as soon as the decision is given.",
+    )
+    add_run_args(parser, checkpoint=True, batch=True)
+    return parser.parse_args()
+
+
+@dataclass
+class Match:
+    """A single game of the tournament."""
+    match_id: int
+    interrogator: str
+    interrogated: str
+    evasion: bool
+    repetition: int
+
+    @property
+    def interrogator_type(self) -> str:
+        return parse_entity(self.interrogator)[0].lower()
+
+    @property
+    def interrogated_type(self) -> str:
+        return parse_entity(self.interrogated)[0].lower()
+
+    @property
+    def providers(self) -> List[str]:
+        return sorted({self.interrogator_type, self.interrogated_type})
+
+
+@dataclass
+class MatchResult:
+    match: Match
+    verdict: Optional[str] = None
+    error: Optional[str] = None
+    duration: float = 0.0
+
+
+def build_matches(interrogators, interrogated, evasion_modes, repetitions) -> List[Match]:
+    """Expand the tournament matrix into a flat list of matches."""
+    matches = []
+    for interrogator, target, evasion, repetition in itertools.product(
+            interrogators, interrogated, evasion_modes, range(repetitions)):
+        matches.append(Match(len(matches), interrogator, target, evasion, repetition))
+    return matches
+
+
+def parse_provider_caps(caps: List[str]) -> Dict[str, int]:
+    parsed = {}
+    for cap in caps:
+        provider, _, limit = cap.partition("=")
+        if not limit.isdigit() or int(limit) < 1:
+            raise ValueError(f"Invalid provider cap: {cap}. Please use PROVIDER=N with N >= 1.")
+        parsed[provider.lower()] = int(limit)
+    return parsed
+
+
+class ProviderLimiter:
+    """Caps the number of concurrent games per provider."""
+
+    def __init__(self, caps: Dict[str, int]):
+        self.semaphores = {provider: asyncio.Semaphore(limit) for provider, limit in caps.items()}
+
+    async def acquire(self, providers: List[str]):
+        # Providers are always acquired in sorted order so two games can't deadlock each other
+        acquired = []
+        try:
+            for provider in providers:
+                if provider in self.semaphores:
+                    await self.semaphores[provider].acquire()
+                    acquired.append(provider)
+        except BaseException:
+            # Cancelled while waiting, give back the caps already taken
+            self.release(acquired)
+            raise
+
+    def release(self, providers: List[str]):
+        for provider in reversed(providers):
+            if provider in self.semaphores:
+                self.semaphores[provider].release()
+
+
+async def play_match(match: Match, workers: asyncio.Semaphore, limiter: ProviderLimiter, test_mode: bool,
+                     stream: bool = False, checkpoint_dir: Optional[str] = None,
+                     num_questions: int = NUMBER_OF_QUESTIONS, confidence_threshold: Optional[float] = None,
+                     jury: List[str] = ()) -> MatchResult:
+    """Play a single game with its own handlers, within the worker and provider caps."""
+    result = MatchResult(match)
+    checkpoint = None
+    if checkpoint_dir:
+        try:
+            checkpoint = Checkpoint(checkpoint_path(checkpoint_dir, match.interrogator_type, match.interrogated_type,
+                                                    match.evasion, suffix=str(match.match_id)),
+                                    game_settings(num_questions, confidence_threshold))
+        except CheckpointMismatch as e:
+            # Neither resumed nor overwritten, the saved game may still be wanted
+            result.error = str(e)
+            return result
+        if checkpoint.finished:
+            # Played to the end before the batch was interrupted
+            result.verdict = checkpoint.state["history"][-1]["final_verdict"]
+            return result
+    # A game waits for its providers' caps before it takes a worker, so games held back by a capped provider
+    # don't keep workers idle that games of other providers could use
+    await limiter.acquire(match.providers)
+    try:
+        async with workers:
+            start = time.monotonic()
+            try:
+                interrogator_type, interrogator_key = parse_entity(match.interrogator)
+                interrogated_type, interrogated_key = parse_entity(match.interrogated)
+                adaptive = confidence_threshold is not None
+                interrogator = await acreate_handler(interrogator_type, "interrogator", test_mode, match.evasion,
+                                                     interrogator_key, num_questions, adaptive)
+                interrogated = await acreate_handler(interrogated_type, "interrogated", test_mode, match.evasion,
+                                                     interrogated_key, num_questions, adaptive)
+                jurors = await acreate_jurors(jury, test_mode, match.evasion, num_questions)
+
+                # Repetitions are otherwise identical games, each must get its own responses from the cache
+                with cache_sample(f"repetition {match.repetition}"):
+                    async with batch_game():
+                        history = await arun_conversation(interrogator, interrogated, num_questions, verbose=False,
+                                                          stream=stream, checkpoint=checkpoint,
+                                                          confidence_threshold=confidence_threshold, jurors=jurors)
+                save_game(match.interrogator_type, match.interrogated_type, history, match.evasion,
+                          suffix=str(match.match_id))
+                if checkpoint is not None:
+                    checkpoint.finish(history)
+                result.verdict = history[-1]["final_verdict"]
+            except Exception as e:
+                result.error = str(e)
+            finally:
+                result.duration = time.monotonic() - start
+    finally:
+        limiter.release(match.providers)
+    return result
+
+
+async def run_tournament(matches: List[Match], workers: int, provider_caps: Dict[str, int], test_mode: bool,
+                         stream: bool = False, checkpoint_dir: Optional[str] = None,
+                         num_questions: int = NUMBER_OF_QUESTIONS, confidence_threshold: Optional[float] = None,
+                         jury: List[str] = ()) -> List[MatchResult]:
+    """Play all the matches on one event loop, with at most `workers` games in flight."""
+    worker_slots = asyncio.Semaphore(workers)
+    limiter = ProviderLimiter(provider_caps)
+    tasks = [asyncio.create_task(play_match(match, worker_slots, limiter, test_mode, stream, checkpoint_dir,
+                                            num_questions, confidence_threshold, jury))
+             for match in matches]
+    results = []
+    for task in asyncio.as_completed(tasks):
+        result = await task
+        results.append(result)
+        status = Fore.RED + f"error: {result.error}" if result.error else f"verdict: {parse_verdict(result.verdict)}"
+        print(f"[{len(results)}/{len(matches)}] {result.match.interrogator_type} vs "
+              f"{result.match.interrogated_type} (evasion={result.match.evasion}) "
+              f"in {result.duration:.1f}s - {status}")
+    await clients.aclose()
+    return sorted(results, key=lambda r: r.match.match_id)
+
+
+def print_results_table(results: List[MatchResult]):
+    """Print one row per (interrogator, interrogated, evasion) cell."""
+    cells = {}
+    for result in results:
+        key = (result.match.interrogator_type, result.match.interrogated_type, result.match.evasion)
+        cell = cells.setdefault(key, {"games": 0, "human": 0, "ai": 0, "undecided": 0, "errors": 0, "correct": 0})
+        cell["games"] += 1
+        if result.error:
+            cell["errors"] += 1
+            continue
+        label = parse_verdict(result.verdict)
+        if label is None:
+            cell["undecided"] += 1
+            continue
+        cell[label] += 1
+        # Humans can't be entered in tournaments, so the right answer is always "ai"
+        cell["correct"] += label == "ai"
+
+    header = f"{'interrogator':<14}{'interrogated':<14}{'evasion':<9}{'games':>7}{'human':>7}{'ai':>7}" \
+             f"{'undecided':>11}{'errors':>8}{'accuracy':>10}"
+    print(Style.BRIGHT + header)
+    for (interrogator, interrogated, evasion), cell in sorted(cells.items()):
+        decided = cell["human"] + cell["ai"]
+        accuracy = f"{cell['correct'] / decided:.0%}" if decided else "-"
+        print(f"{interrogator:<14}{interrogated:<14}{str(evasion):<9}{cell['games']:>7}{cell['human']:>7}"
+              f"{cell['ai']:>7}{cell['undecided']:>11}{cell['errors']:>8}{accuracy:>10}")
+
+
+def main():
+    args = parse_args()
+    configure_run(args)
+    reject_humans(args.interrogated, "Humans can't be interrogated in a tournament. Please use main.py instead.")
+    evasion_modes = {"off": [False], "on": [True], "both": [False, True]}[args.evasion]
+    matches = build_matches(args.interrogators, args.interrogated, evasion_modes, args.repetitions)
+    provider_caps = parse_provider_caps(args.provider_cap)
+
+    print(Fore.BLUE + Style.BRIGHT + f"Running {len(matches)} games with {args.workers} workers\n")
+    start = time.monotonic()
+    try:
+        results = asyncio.run(run_tournament(matches, args.workers, provider_caps, args.test, args.stream,
+                                             args.checkpoint_dir, args.questions, args.confidence_threshold,
+                                             args.jury))
+    finally:
+        get_recorder().close()
+        if get_store():
+            get_store().close()
+    elapsed = time.monotonic() - start
+    print(Fore.MAGENTA + Style.BRIGHT + f"\nThe tournament has ended: {len(results)} games in {elapsed:.1f}s "
+                                        f"({len(results) / elapsed:.2f} games/s)\n")
+    if get_batcher():
+        print(Fore.BLUE + f"{get_batcher().requests} calls sent in {get_batcher().jobs} batch jobs\n")
+    print_results_table(results)
+    print()
+    print_metrics_summary()
+
+
+if __name__ == "__main__":
+    main()